@@ -1,32 +1,19 @@
 import collections
+import gc
 import math
 import random
+import time
 
-from lib.game import Game, Speed
+import numpy as np
 
+from lib.bitboard import (
+    KING_ATTACK_ARRAY, KNIGHT_ATTACK_ARRAY, PAWN_ATTACK_ARRAYS, SQUARE_INDEX, get_attacker_squares_by_type,
+    get_attacks, get_line_attack_arrays, square_bit,
+)
+from lib.board import Piece
+from lib.clock import VirtualClock
+from lib.game import Game, Speed
 
-KNIGHT_DIRS = [
-    (2, 1),
-    (2, -1),
-    (1, -2),
-    (-1, -2),
-    (-2, -1),
-    (-2, 1),
-    (-1, 2),
-    (1, 2),
-]
-BISHOP_DIRS = [
-    (1, 1),
-    (1, -1),
-    (-1, -1),
-    (-1, 1),
-]
-ROOK_DIRS = [
-    (1, 0),
-    (0, -1),
-    (-1, 0),
-    (0, 1),
-]
 
 PIECE_SCORES = {
     'P': 1,
@@ -55,16 +42,42 @@ VULN_SCORES = {
 
 SCORE_BUFFER = 2
 
+# with a time budget, candidate moves are scored this many at a time, checking the time in between
+SCORING_CHUNK_SIZE = 16
+
+# decisions each bot keeps for positions it sees again; the least recently used are dropped first
+DECISION_CACHE_SIZE = 1024
+
+# position of each piece type in the per-type arrays used for scoring
+TYPE_INDEX = {t: i for i, t in enumerate(Piece.ALL_TYPES)}
+
+
+# difficulties players can pick for a bot, and the only ones the web app builds bots for on request
+PUBLIC_DIFFICULTIES = ('novice', 'intermediate', 'advanced')
+
+# difficulties only the tournament and benchmarks play (see get_experimental_bot)
+EXPERIMENTAL_DIFFICULTIES = ('expert',)
+
 
 def get_bot(difficulty):
+    # time budgets are in microseconds
     if difficulty == 'novice':
-        return BasicBot(difficulty, 39, 5)
+        return BasicBot(difficulty, 39, 5, time_budget=10000)
     elif difficulty == 'intermediate':
-        return BasicBot(difficulty, 26, 2)
+        return BasicBot(difficulty, 26, 2, time_budget=20000)
     elif difficulty == 'advanced':
-        return BasicBot(difficulty, 13, 1)
+        return BasicBot(difficulty, 13, 1, time_budget=30000)
     elif difficulty == 'campaign':
-        return CampaignBot(difficulty, 10, 1)
+        return CampaignBot(difficulty, 10, 1, time_budget=30000)
+    else:
+        raise ValueError('Unexpected difficulty ' + difficulty)
+
+
+# bots kept out of get_bot, so no request can get one into a live game. the search bot spends 100ms on a decision and
+# isn't measurably stronger than advanced yet (see python -m lib.tournament)
+def get_experimental_bot(difficulty):
+    if difficulty == 'expert':
+        return SearchBot(difficulty, 13, 1, time_budget=100000)
     else:
         raise ValueError('Unexpected difficulty ' + difficulty)
 
@@ -78,26 +91,143 @@ class BasicBot(object):
     VULN_WEIGHT = 16
     PROTECT_WEIGHT = 8
 
-    def __init__(self, difficulty, ticks_per_move, top_n_moves):
+    # whether threats to a square are weighed by when the enemy could capture there, going by the game's reach map
+    # (1), or all count the same (0); see _get_threat_weight. off until it measures stronger, since it makes decisions
+    # about 10% slower
+    REACH_TIMING = 0
+
+    # whether the bot considers moving at fixed intervals, at the phase it's given, rather than at random (see
+    # BotScheduler)
+    FIXED_SCHEDULE = False
+
+    def __init__(
+        self, difficulty, ticks_per_move, top_n_moves, time_budget=None, decision_cache_size=DECISION_CACHE_SIZE
+    ):
         self.difficulty = difficulty
         self.ticks_per_move = ticks_per_move
         self.top_n_moves = top_n_moves
 
+        # microseconds a decision may take before settling for the best move found so far (None for no limit)
+        self.time_budget = time_budget
+
+        # (microseconds taken, whether it ran out of time before scoring every move, whether it went over budget,
+        # whether it came from the cache) for the last decision
+        self.last_decision = (0, False, False, False)
+
+        # decision key -> the moves to pick from, as (piece id, from row, from col, row, col, dist) and score, in least
+        # recently used order
+        self.decision_cache_size = decision_cache_size
+        self.decision_cache = collections.OrderedDict()
+        self.num_cache_hits = 0
+        self.num_cache_misses = 0
+
+        # seconds it has recently taken to score each candidate move
+        self._scoring_time = None
+
     def get_move(self, game, player, randnum):
         if not self._should_move(game, randnum):
             return None
 
-        # precompute some stuff for performance
-        location_to_piece_map, piece_to_location_map = self._get_location_to_piece_bimap(game, player)
-        current_pressures, current_protects = self._compute_current_pressures_and_protects(
-            game, location_to_piece_map
+        return self.choose_move(game, player)
+
+    # picks a move now, regardless of whether the bot would consider moving this tick
+    def choose_move(self, game, player):
+        move = self._choose_move(game, player)
+        if move is None:
+            return None
+
+        print 'ai choosing move %s with score %s' % (move[0], move[1])
+        return move[0][:3]
+
+    # the (move, score) picked, or None if there's nothing to pick from
+    def _choose_move(self, game, player):
+        start = time.time()
+        deadline = None if self.time_budget is None else start + self.time_budget / 1e6
+
+        # the same position always has the same moves to pick from, so only the pick is made again
+        key = self._get_decision_key(game, player) if self.decision_cache_size else None
+        cached = None if key is None else self._get_cached_decision(game, key)
+        if cached is not None:
+            self.num_cache_hits += 1
+            best_moves = cached
+            cut_short = False
+        else:
+            self.num_cache_misses += 1
+            candidates, scores = self._score_candidates(game, player, deadline)
+
+            # candidates that didn't get scored in time are left out
+            scored = [(candidate, score) for candidate, score in zip(candidates, scores) if score is not None]
+            best_moves = self._get_best_moves([c for c, score in scored], [score for c, score in scored])
+
+            # moves picked from only some of the candidates aren't worth keeping
+            cut_short = len(scored) < len(candidates)
+            if key is not None and not cut_short:
+                self._cache_decision(key, best_moves)
+
+        elapsed = int((time.time() - start) * 1e6)
+        self.last_decision = (
+            elapsed, cut_short, self.time_budget is not None and elapsed > self.time_budget, cached is not None
         )
 
+        if len(best_moves) == 0:
+            return None
+
+        return random.choice(best_moves)
+
+    # key for caching decisions: the position hash covers every piece (captured ones still attack), how far along the
+    # active moves are and how long each cooldown has left, and the speed covers the rest
+    def _get_decision_key(self, game, player):
+        return game.position_hash, player, game.move_ticks, game.cooldown_ticks
+
+    # the cached moves to pick from, with their pieces looked up again, or None if there are none. pieces of the same
+    # type and player that have swapped squares hash the same, and one bot can see boards with other piece ids (like
+    # campaign levels) or a hash collision, so the moves are only used if every piece is still there, where it was
+    def _get_cached_decision(self, game, key):
+        cached = self.decision_cache.get(key)
+        if cached is None:
+            return None
+
+        best_moves = []
+        for (piece_id, from_row, from_col, row, col, dist), score in cached:
+            piece = game.board.get_piece_by_id(piece_id)
+            if piece is None or piece.captured or piece.row != from_row or piece.col != from_col:
+                return None
+            best_moves.append(((piece, row, col, dist), score))
+
+        del self.decision_cache[key]
+        self.decision_cache[key] = cached
+        return best_moves
+
+    def _cache_decision(self, key, best_moves):
+        self.decision_cache[key] = [
+            ((piece.id, piece.row, piece.col, row, col, dist), score) for (piece, row, col, dist), score in best_moves
+        ]
+        if len(self.decision_cache) > self.decision_cache_size:
+            self.decision_cache.popitem(last=False)
+
+    # all possible moves and their scores, with None for those that couldn't be scored before the deadline
+    def _score_candidates(self, game, player, deadline):
+        # precompute some stuff for performance
+        occupied, piece_to_location_map = self._get_occupancy_and_locations(game, player)
+        current_pressures, current_protects = self._compute_current_pressures_and_protects(game, occupied)
+
         # print 'curr pres', current_pressures
         # print 'curr prot', current_protects
 
-        # get all possible moves with scores
-        all_moves = []
+        scored_pieces = self._get_scored_pieces(game, current_pressures, current_protects, piece_to_location_map)
+
+        candidates = self._get_candidates(game, player, occupied, piece_to_location_map)
+        if deadline is None:
+            scores = self._get_scores(game, current_pressures, current_protects, scored_pieces, candidates)
+        else:
+            scores = self._get_scores_until(
+                game, current_pressures, current_protects, scored_pieces, candidates, deadline
+            )
+        return candidates, scores
+
+    # all possible moves, with the occupancy to score them against
+    def _get_candidates(self, game, player, occupied, piece_to_location_map):
+        candidates = []
         for piece in game.board.pieces:
             if (
                 piece.captured or piece.player != player or
@@ -105,149 +235,143 @@ class BasicBot(object):
             ):
                 continue
 
-            # temporarily remove piece from map, otherwise calculations for blocking will be wrong
+            # leave the piece out of the occupancy, otherwise calculations for blocking will be wrong
             location = piece_to_location_map[piece.id]
-            del location_to_piece_map[location]
+            piece_occupied = occupied & ~square_bit(location[0], location[1])
 
             piece_moves = self._get_possible_moves(game, piece)
             for move in piece_moves:
-                score = self._get_score(
-                    game, current_pressures, current_protects, location_to_piece_map,
-                    piece_to_location_map, move
-                )
-                if score >= self._move_score_threshold():
-                    all_moves.append((move, score))
+                candidates.append((move, piece_occupied))
+
+        return candidates
+
+    # scores candidates until the deadline, the most promising first: captures, then moves of pieces under pressure,
+    # then the rest. candidates left when time runs out get None
+    def _get_scores_until(self, game, current_pressures, current_protects, scored_pieces, candidates, deadline):
+        # no need to put them in order if they should all fit in the time left
+        if self._scoring_time is not None and self._scoring_time * len(candidates) <= deadline - time.time():
+            scoring_start = time.time()
+            scores = self._get_scores(game, current_pressures, current_protects, scored_pieces, candidates)
+            if candidates:
+                self._scoring_time = (time.time() - scoring_start) / len(candidates)
+            return scores
+
+        def get_priority(i):
+            piece, row, col, dist = candidates[i][0]
+            target = game.board.get_piece_by_location(row, col)
+            if target is not None and target.player != piece.player:
+                return 0
+            elif current_pressures[piece.id]:
+                return 1
+            return 2
+
+        order = sorted(xrange(len(candidates)), key=get_priority)
+        scores = [None] * len(candidates)
+        num_scored = 0
+        while num_scored < len(order):
+            # always score at least one chunk, so there is something to pick from
+            time_left = deadline - time.time()
+            if num_scored > 0 and time_left <= 0:
+                break
+
+            # score as many as should fit in the time left, going by how long scoring has been taking
+            chunk_size = SCORING_CHUNK_SIZE
+            if self._scoring_time is not None:
+                chunk_size = max(chunk_size, int(time_left / self._scoring_time))
 
-            # add the piece back
-            location_to_piece_map[location] = piece
-            piece_to_location_map[piece.id] = location
+            chunk = order[num_scored:num_scored + chunk_size]
+            chunk_start = time.time()
+            chunk_scores = self._get_scores(
+                game, current_pressures, current_protects, scored_pieces, [candidates[i] for i in chunk]
+            )
+            self._scoring_time = (time.time() - chunk_start) / len(chunk)
+
+            for i, score in zip(chunk, chunk_scores):
+                scores[i] = score
+            num_scored += len(chunk)
+
+        return scores
+
+    # the (move, score) pairs to pick from, in order of decreasing score
+    def _get_best_moves(self, candidates, scores):
+        all_moves = []
+        for (move, piece_occupied), score in zip(candidates, scores):
+            if score >= self._move_score_threshold():
+                all_moves.append((move, score))
 
         if len(all_moves) == 0:
-            return None
+            return []
 
-        # sorts all moves by score and picks a random one with score in the top_n_moves
+        # sorts all moves by score and keeps the ones with score in the top_n_moves
         all_moves.sort(key=lambda p: p[1], reverse=True)
         top_n = all_moves[:self.top_n_moves]
         score_threshold = top_n[-1][1] - SCORE_BUFFER
 
-        move = random.choice([m for m in all_moves if m[1] >= score_threshold])
-        print 'ai choosing move %s with score %s' % (move[0], move[1])
-        return move[0][:3]
+        return [m for m in all_moves if m[1] >= score_threshold]
 
     def _should_move(self, game, randnum):
         # moves approx every ticks_per_move (with randomness)
         return game.current_tick % self.ticks_per_move == randnum % self.ticks_per_move
 
-    def _get_location_to_piece_bimap(self, game, player):
-        location_to_piece_map = game.board.get_location_to_piece_map()
-        piece_to_location_map = game.board.get_piece_to_location_map()
-
-        # for our own moving pieces, take into consideration the move
-        for move in game.active_moves:
-            piece = move.piece
-            if not piece.captured and piece.player == player and (piece.row, piece.col) in location_to_piece_map:
-                del location_to_piece_map[(piece.row, piece.col)]
-
-        for move in game.active_moves:
-            piece = move.piece
-            if not piece.captured and piece.player == player:
-                row, col = move.move_seq[-1]
-                location_to_piece_map[(row, col)] = piece
-                piece_to_location_map[piece.id] = (row, col)
-
-        return location_to_piece_map, piece_to_location_map
-
-    def _compute_current_pressures_and_protects(self, game, location_to_piece_map):
-        current_pressures = collections.defaultdict(list)
-        current_protects = collections.defaultdict(list)
-        for p1 in game.board.pieces:
-            for p2 in game.board.pieces:
-                if p1.player == p2.player:
-                    if self._can_target(location_to_piece_map, p2, p1.row, p1.col):
-                        current_protects[p1.id].append(p2)
-                else:
-                    if self._can_target(location_to_piece_map, p2, p1.row, p1.col):
-                        current_pressures[p1.id].append(p2)
-
-        return current_pressures, current_protects
+    # bitboard of occupied squares and map of piece locations, where our own moving pieces are at their destinations
+    def _get_occupancy_and_locations(self, game, player):
+        return game.get_analysis().get_occupancy_and_locations(player)
 
+    def _compute_current_pressures_and_protects(self, game, occupied):
+        return game.get_analysis().get_pressures_and_protects(occupied)
+
+    # the piece's legal moves as (piece, row, col, movements to get there), where pawns always count one
     def _get_possible_moves(self, game, piece):
         moves = []
+        for row, col in game.legal_moves(piece.id):
+            if piece.type == 'P':
+                dist = 1
+            elif piece.type == 'N':
+                dist = 2
+            else:
+                dist = max(abs(row - piece.row), abs(col - piece.col))
+            moves.append((piece, row, col, dist))
 
-        if piece.type == 'P':
-            row_dir = -1 if piece.player == 1 else 1
-            row = piece.row + row_dir
-            for col in [piece.col - 1, piece.col, piece.col + 1]:
-                if (
-                    row >= 0 and row < 8 and col >= 0 and col < 8 and
-                    game._get_pawn_move_seq(piece, row, col) is not None
-                ):
-                    moves.append((piece, row, col, 1))
+        return moves
 
-            if (
-                (piece.player == 1 and piece.row == 6) or
-                (piece.player == 2 and piece.row == 1)
-            ):
-                row = piece.row + 2 * row_dir
-                if row >= 0 and row < 8 and game._get_pawn_move_seq(piece, row, piece.col) is not None:
-                    moves.append((piece, row, piece.col, 1))
-
-        if piece.type == 'N':
-            for row_dir, col_dir in KNIGHT_DIRS:
-                row, col = piece.row + row_dir, piece.col + col_dir
-                if (
-                    row >= 0 and row < 8 and col >= 0 and col < 8 and
-                    game._get_knight_move_seq(piece, row, col) is not None
-                ):
-                    moves.append((piece, row, col, 2))
-
-        if piece.type in ['B', 'Q', 'K']:
-            for row_dir, col_dir in BISHOP_DIRS:
-                limit = 1 if piece.type == 'K' else 7
-                for i in xrange(1, limit + 1):
-                    row, col = piece.row + i * row_dir, piece.col + i * col_dir
-                    if (
-                        row >= 0 and row < 8 and col >= 0 and col < 8 and
-                        game._get_bishop_move_seq(piece, row, col) is not None
-                    ):
-                        moves.append((piece, row, col, i))
-                    else:
-                        break
-
-        if piece.type in ['R', 'Q', 'K']:
-            for row_dir, col_dir in ROOK_DIRS:
-                limit = 1 if piece.type == 'K' else 7
-                for i in xrange(1, limit + 1):
-                    row, col = piece.row + i * row_dir, piece.col + i * col_dir
-                    if (
-                        row >= 0 and row < 8 and col >= 0 and col < 8 and
-                        game._get_rook_move_seq(piece, row, col) is not None
-                    ):
-                        moves.append((piece, row, col, i))
-                    else:
-                        break
-
-        if piece.type == 'K' and not piece.moved:
-            for col in [2, 6]:
-                rook_col = 0 if col == 2 else 7
-                rook_to_col = 3 if col == 2 else 5
-                rook_piece = game.board.get_piece_by_location(piece.row, rook_col)
-                if (
-                    rook_piece and not rook_piece.moved and
-                    game._get_rook_move_seq(piece, piece.row, col) is not None and
-                    game._get_rook_move_seq(rook_piece, rook_piece.row, rook_to_col) is not None
-                ):
-                    moves.append((piece, piece.row, col, 2))
+    # per-piece facts for scoring that don't depend on the move, in board order: the piece, its square, the square it
+    # will be at, how much protecting it is worth, whether it's protected, whether it can be captured, the enemies
+    # that become less vulnerable if it is and the ticks until it could capture on each square (None without
+    # REACH_TIMING)
+    def _get_scored_pieces(self, game, current_pressures, current_protects, piece_to_location_map):
+        pieces = [p for p in game.board.pieces if not p.captured]
+
+        arrival_ticks = [None] * len(game.board.pieces)
+        if self.REACH_TIMING:
+            arrival_ticks = game.get_analysis().get_arrival_ticks()
+
+        relieved = collections.defaultdict(list)
+        for p2 in pieces:
+            for p in current_pressures[p2.id]:
+                relieved[p.id].append((p2, VULN_SCORES[p2.type]))
+
+        scored_pieces = []
+        for i, p in enumerate(game.board.pieces):
+            if p.captured:
+                continue
 
-        return moves
+            ploc = piece_to_location_map[p.id]
 
-    def _get_score(
-        self, game, current_pressures, current_protects, location_to_piece_map, piece_to_location_map, move
-    ):
-        piece, row, col, dist = move
-        ticks_to_move = dist * game.move_ticks
-        new_piece = piece.at_position(row, col)
+            protect_value = 0
+            if p.type != 'K' and len(current_pressures[p.id]) > 0:
+                protect_value += min(
+                    PRESSURE_SCORES[p2.type] for p2 in current_pressures[p.id]
+                ) - PIECE_SCORES[p.type]
+
+            scored_pieces.append((
+                p, square_bit(p.row, p.col), square_bit(ploc[0], ploc[1]), max(0.1, protect_value),
+                p.type != 'K' and len(current_protects[p.id]) > 0, not game._already_moving(p), relieved[p.id],
+                arrival_ticks[i],
+            ))
 
+        return scored_pieces
+
+    def _get_position_scores(self, piece, row, col):
         # moving forward is good
         row_score = piece.row - row if piece.player == 1 else row - piece.row
         if piece.type == 'P':
@@ -260,89 +384,82 @@ class BasicBot(object):
         # moving toward the center is good
         col_score = int(abs(3.5 - piece.col) - abs(3.5 - col))
 
-        capture_score, pressure_score, vuln_score, protect_score = 0, 0, 0, 0
-        new_vulns = []
-        new_protects = []
-        for p in game.board.pieces:
-            if p.captured or p.id == piece.id:
-                continue
+        return row_score, col_score
 
-            ploc = piece_to_location_map[p.id]
-
-            # capture score
-            if (
-                p.row == row and p.col == col and
-                p.player != piece.player and not game._already_moving(p)
-            ):
-                capture_score += PIECE_SCORES[p.type] * self._capture_decay(game, p, ticks_to_move)
-
-                # capturing improves vulnerable score for other pieces
-                for p2 in game.board.pieces:
-                    if p2.captured or p2.player == p.player or p2.id == piece.id:
-                        continue
-
-                    if p in current_pressures[p2.id]:
-                        vuln_score += VULN_SCORES[p2.type]
-
-            # vulnerable score
-            if p.player != piece.player:
-                old_vuln = p in current_pressures[piece.id]
-                new_vuln = 1.5 * self._can_target(location_to_piece_map, p, row, col)
-
-                vuln_score -= (new_vuln - old_vuln) * VULN_SCORES[piece.type]
-
-                if new_vuln:
-                    new_vulns.append(p)
+    # scores a single move; _get_scores computes the same scores for all candidates at once
+    def _get_score(self, game, current_pressures, current_protects, scored_pieces, occupied, move):
+        piece, row, col, dist = move
+        ticks_to_move = dist * game.move_ticks
+        row_score, col_score = self._get_position_scores(piece, row, col)
 
-            # protecting score
-            if p.player == piece.player:
-                protect = piece in current_protects[p.id]
-                new_protect = self._can_target(location_to_piece_map, new_piece, ploc[0], ploc[1])
+        # squares the piece would attack, and squares from which each type of piece would attack it
+        square = SQUARE_INDEX[(row, col)]
+        attacks = get_attacks(piece.type, piece.player, square, occupied)
+        vuln_squares = get_attacker_squares_by_type(square, 3 - piece.player, occupied)
+        protected_squares = get_attacker_squares_by_type(square, piece.player, occupied)
+        pressures = current_pressures[piece.id]
+        protects = current_protects[piece.id]
 
-                protect_value = 0
-                if p.type != 'K' and len(current_pressures[p.id]) > 0:
-                    protect_value += min(
-                        PRESSURE_SCORES[p2.type] for p2 in current_pressures[p.id]
-                    ) - PIECE_SCORES[p.type]
-                protect_score += (new_protect - protect) * max(0.1, protect_value)
+        # the piece can move away again once it's there and off cooldown
+        escape_ticks = ticks_to_move + game.cooldown_ticks
 
-        for p in game.board.pieces:
-            if p.captured or p.id == piece.id:
+        capture_score, pressure_score, vuln_score, protect_score = 0, 0, 0, 0
+        new_vulns = []
+        protected_changes = []
+        for p, bit, location_bit, protect_value, protected, capturable, relieved, arrivals in scored_pieces:
+            if p is piece:
                 continue
 
-            ploc = piece_to_location_map[p.id]
+            if p.player != piece.player:
+                # capture score
+                if capturable and p.row == row and p.col == col:
+                    capture_score += PIECE_SCORES[p.type] * self._capture_decay(game, p, ticks_to_move)
 
-            # protected score
-            if p.player == piece.player:
-                protect = p in current_protects[piece.id]
-                new_protect = self._can_target(location_to_piece_map, p.at_position(ploc[0], ploc[1]), row, col)
+                    # capturing improves vulnerable score for other pieces
+                    for p2, p2_vuln in relieved:
+                        if p2 is not piece:
+                            vuln_score += p2_vuln
 
-                protect_value = 0
-                if piece.type != 'K' and len(new_vulns) > 0:
-                    protect_value += min(
-                        PRESSURE_SCORES[p2.type] for p2 in new_vulns
-                    ) - PIECE_SCORES[piece.type]
-                protect_score += (new_protect - protect) * max(0.1, protect_value)
+                # vulnerable score
+                old_vuln = p in pressures
+                new_vuln = 1.5 * bool(vuln_squares[p.type] & bit)
+                threat = new_vuln
+                if arrivals is not None:
+                    threat *= self._get_threat_weight(arrivals.item(square) - escape_ticks)
 
-                if new_protect:
-                    new_protects.append(p)
+                vuln_score -= (threat - old_vuln) * VULN_SCORES[piece.type]
 
-        for p in game.board.pieces:
-            if p.captured or p.id == piece.id:
-                continue
+                if new_vuln:
+                    new_vulns.append(p)
 
-            # pressure score
-            if p.player != piece.player:
+                # pressure score
                 old_pressure = piece in current_pressures[p.id]
-                new_pressure = self._can_target(location_to_piece_map, new_piece, p.row, p.col)
+                new_pressure = bool(attacks & bit)
 
                 pressure_value = PRESSURE_SCORES[p.type]
-                if self._can_target(location_to_piece_map, p, new_piece.row, new_piece.col):
+                if new_vuln:
                     pressure_value -= PRESSURE_SCORES[piece.type]
-                elif p.type != 'K' and len(current_protects[p.id]) > 0:
+                elif protected:
                     pressure_value = max(0, pressure_value - PIECE_SCORES[piece.type])
 
                 pressure_score += (new_pressure - old_pressure) * pressure_value
+            else:
+                # protecting score
+                protect = piece in current_protects[p.id]
+                new_protect = bool(attacks & location_bit)
+
+                protect_score += (new_protect - protect) * protect_value
+
+                # protected score, which is only known once all the new vulnerabilities are
+                protected_changes.append(bool(protected_squares[p.type] & location_bit) - (p in protects))
+
+        protect_value = 0
+        if piece.type != 'K' and len(new_vulns) > 0:
+            protect_value += min(
+                PRESSURE_SCORES[p2.type] for p2 in new_vulns
+            ) - PIECE_SCORES[piece.type]
+        for change in protected_changes:
+            protect_score += change * max(0.1, protect_value)
 
         # print piece, 'r', row, 'c', col, 'rsc', row_score, 'csc', col_score, 'cap', capture_score, \
         #     'pres', pressure_score, 'vuln', vuln_score, 'prot', protect_score
@@ -356,17 +473,154 @@ class BasicBot(object):
             self.PROTECT_WEIGHT * protect_score
         )
 
-    def _capture_decay(self, game, piece, ticks_to_move):
-        piece_cooldown = None
-        for cooldown in game.cooldowns:
-            if cooldown.piece.id == piece.id:
-                piece_cooldown = cooldown
-                break
+    # scores of all candidate (move, occupancy) pairs of one player, as arrays of candidates by pieces. the results are
+    # exactly those of _get_score: terms are combined in the same order, and the protect terms, which aren't exact in
+    # floating point, are summed sequentially
+    def _get_scores(self, game, current_pressures, current_protects, scored_pieces, candidates):
+        if len(candidates) == 0:
+            return []
+
+        player = candidates[0][0][0].player
+        pieces = [scored[0] for scored in scored_pieces]
+        index = {p.id: i for i, p in enumerate(pieces)}
+        num_pieces = len(pieces)
+
+        # per-piece arrays, in board order
+        bits = np.array([scored[1:3] for scored in scored_pieces], np.uint64)
+        bits, location_bits = bits[:, 0], bits[:, 1]
+        values = np.array([
+            scored[3:6] + (
+                TYPE_INDEX[p.type], p.player != player, PRESSURE_SCORES[p.type], PIECE_SCORES[p.type],
+                VULN_SCORES[p.type], p.row, p.col,
+            )
+            for p, scored in zip(pieces, scored_pieces)
+        ], np.float64)
+        protect_values = values[:, 0]
+        protected, capturable, enemy = values[:, 1] != 0, values[:, 2] != 0, values[:, 4] != 0
+        types = values[:, 3].astype(np.intp)
+        pressure_scores, piece_scores, vuln_scores = values[:, 5:8].astype(np.int64).T
+        piece_rows, piece_cols = values[:, 8], values[:, 9]
+
+        # pressuring[i, j] and protecting[i, j] are whether piece i currently pressures or protects piece j
+        pressuring = np.zeros((num_pieces, num_pieces), np.bool_)
+        protecting = np.zeros((num_pieces, num_pieces), np.bool_)
+        for j, p in enumerate(pieces):
+            for p2 in current_pressures[p.id]:
+                if p2.id in index:
+                    pressuring[index[p2.id], j] = True
+            for p2 in current_protects[p.id]:
+                if p2.id in index:
+                    protecting[index[p2.id], j] = True
+
+        # per-candidate arrays
+        num_candidates = len(candidates)
+        movers = np.array([index[move[0].id] for move, occupied in candidates], np.intp)
+        rows = np.array([move[1] for move, occupied in candidates], np.intp)
+        cols = np.array([move[2] for move, occupied in candidates], np.intp)
+        squares = rows * 8 + cols
+        destination_bits = np.uint64(1) << squares.astype(np.uint64)
+
+        # same as _get_position_scores
+        row_scores = piece_rows[movers] - rows if player == 1 else rows - piece_rows[movers]
+        promoted = rows == (0 if player == 1 else 7)
+        row_scores = np.where(types[movers] == TYPE_INDEX['P'], np.where(promoted, 16, row_scores * 2), row_scores)
+        col_scores = np.trunc(np.abs(3.5 - piece_cols[movers]) - np.abs(3.5 - cols))
+
+        # attacks are symmetric, so the lines from the destination give both what the piece would attack and where
+        # it would be attacked or protected from; only pawns differ by direction
+        occupied = np.array([occupied for move, occupied in candidates], np.uint64)
+        bishop, rook = get_line_attack_arrays(squares, occupied)
+        vuln_squares = np.column_stack([
+            PAWN_ATTACK_ARRAYS[player][squares], KNIGHT_ATTACK_ARRAY[squares], bishop, rook, bishop | rook,
+            KING_ATTACK_ARRAY[squares],
+        ])
+        protected_squares = vuln_squares.copy()
+        protected_squares[:, 0] = PAWN_ATTACK_ARRAYS[3 - player][squares]
+        attacks = vuln_squares[np.arange(num_candidates), types[movers]]
+
+        mover_types = types[movers]
+        not_mover = np.arange(num_pieces)[None, :] != movers[:, None]
+        enemies = enemy[None, :] & not_mover
+        own = ~enemy[None, :] & not_mover
+
+        zero = np.uint64(0)
+        new_vuln = (vuln_squares[:, types] & bits[None, :] != zero) & enemies
+        threat_weights = 1
+        if self.REACH_TIMING:
+            arrivals = np.array([scored[7] for scored in scored_pieces], np.int64)
+            escape_ticks = np.array([move[3] for move, _ in candidates], np.int64) * game.move_ticks
+            threat_weights = self._get_threat_weights(
+                arrivals[:, squares].T - (escape_ticks + game.cooldown_ticks)[:, None]
+            )
+        new_pressure = (attacks[:, None] & bits[None, :]) != zero
+        new_protect = (attacks[:, None] & location_bits[None, :]) != zero
+        new_protected = (protected_squares[:, types] & location_bits[None, :]) != zero
+
+        # capture score, which is rare enough to add up one capture at a time
+        capture_scores = np.zeros(num_candidates, np.float64)
+        vuln_scores_by_candidate = np.zeros(num_candidates, np.float64)
+        captures = enemies & capturable[None, :] & (bits[None, :] == destination_bits[:, None])
+        for k, i in zip(*np.nonzero(captures)):
+            move, occupied = candidates[k]
+            p = pieces[i]
+            capture_scores[k] += PIECE_SCORES[p.type] * self._capture_decay(game, p, move[3] * game.move_ticks)
+
+            # capturing improves vulnerable score for other pieces
+            for p2, p2_vuln in scored_pieces[i][6]:
+                if p2 is not move[0]:
+                    vuln_scores_by_candidate[k] += p2_vuln
+
+        # vulnerable score
+        vuln_changes = 1.5 * new_vuln * threat_weights - pressuring[:, movers].T
+        vuln_scores_by_candidate -= (np.where(enemies, vuln_changes, 0) * vuln_scores[movers][:, None]).sum(axis=1)
+
+        # pressure score
+        pressure_values = np.where(
+            new_vuln, pressure_scores[None, :] - pressure_scores[movers][:, None],
+            np.where(
+                protected[None, :], np.maximum(0, pressure_scores[None, :] - piece_scores[movers][:, None]),
+                pressure_scores[None, :]
+            )
+        )
+        pressure_changes = new_pressure.astype(np.int64) - pressuring[movers]
+        pressure_scores_by_candidate = np.where(enemies, pressure_changes * pressure_values, 0).sum(axis=1)
+
+        # protecting and protected scores, added in the same order as _get_score does
+        protected_values = np.where(
+            (mover_types != TYPE_INDEX['K']) & new_vuln.any(axis=1),
+            np.where(new_vuln, pressure_scores[None, :], np.iinfo(np.int64).max).min(axis=1) - piece_scores[movers],
+            0
+        )
+        protecting_terms = (new_protect.astype(np.int64) - protecting[movers]) * protect_values[None, :]
+        protected_terms = (
+            (new_protected.astype(np.int64) - protecting[:, movers].T) * np.maximum(0.1, protected_values)[:, None]
+        )
+        protect_terms = np.hstack([np.where(own, protecting_terms, 0.0), np.where(own, protected_terms, 0.0)])
+        protect_scores = np.cumsum(protect_terms, axis=1)[:, -1]
+
+        scores = (
+            self.ROW_WEIGHT * row_scores +
+            self.COLUMN_WEIGHT * col_scores +
+            self.CAPTURE_WEIGHT * capture_scores +
+            self.PRESSURE_WEIGHT * pressure_scores_by_candidate +
+            self.VULN_WEIGHT * vuln_scores_by_candidate +
+            self.PROTECT_WEIGHT * protect_scores
+        )
+        return scores.tolist()
 
-        if piece_cooldown:
-            cooldown_ticks = game.cooldown_ticks - (game.current_tick - piece_cooldown.starting_tick)
-        else:
-            cooldown_ticks = 0
+    # how much a threat counts, by how many ticks after the threatened piece could move away the enemy could capture
+    # it: fully if the piece couldn't get away, and decaying exponentially with the time it has to, like _capture_decay
+    def _get_threat_weight(self, ticks_late):
+        if ticks_late <= 0:
+            return 1
+        return math.exp(-ticks_late / 60.0)
+
+    # _get_threat_weight of an array of ticks
+    def _get_threat_weights(self, ticks_late):
+        return np.exp(-np.maximum(ticks_late, 0) / 60.0)
+
+    def _capture_decay(self, game, piece, ticks_to_move):
+        cooldown_ticks = game.get_ticks_until_free(piece)
 
         delta = ticks_to_move - cooldown_ticks
         if delta < 10:
@@ -376,48 +630,6 @@ class BasicBot(object):
         # decays exponentially with the time to react
         return math.exp(- (delta - 10) / 60)
 
-    def _can_target(self, location_to_piece_map, piece, t_row, t_col):
-        if t_row == piece.row and t_col == piece.col:
-            return False
-
-        if piece.type == 'P':
-            row_dir = -1 if piece.player == 1 else 1
-            row = piece.row + row_dir
-            return row == t_row and (piece.col == t_col - 1 or piece.col == t_col + 1)
-
-        if piece.type == 'N':
-            row_delta, col_delta = t_row - piece.row, t_col - piece.col
-            return (row_delta, col_delta) in KNIGHT_DIRS
-
-        if piece.type in ['B', 'Q', 'K']:
-            row_delta, col_delta = t_row - piece.row, t_col - piece.col
-            if abs(row_delta) == abs(col_delta):
-                row_dir, col_dir = row_delta / abs(row_delta), col_delta / abs(col_delta)
-                limit = 1 if piece.type == 'K' else 7
-                for i in xrange(1, limit + 1):
-                    row, col = piece.row + i * row_dir, piece.col + i * col_dir
-                    if row == t_row and col == t_col:
-                        return True
-
-                    if (row, col) in location_to_piece_map:
-                        break
-
-        if piece.type in ['R', 'Q', 'K']:
-            row_delta, col_delta = t_row - piece.row, t_col - piece.col
-            if row_delta == 0 or col_delta == 0:
-                row_dir = row_delta / abs(row_delta) if row_delta != 0 else 0
-                col_dir = col_delta / abs(col_delta) if col_delta != 0 else 0
-                limit = 1 if piece.type == 'K' else 7
-                for i in xrange(1, limit + 1):
-                    row, col = piece.row + i * row_dir, piece.col + i * col_dir
-                    if row == t_row and col == t_col:
-                        return True
-
-                    if (row, col) in location_to_piece_map:
-                        break
-
-        return False
-
     def _move_score_threshold(self):
         # effectively negative infinity
         return -10000
@@ -428,15 +640,177 @@ class CampaignBot(BasicBot):
     ROW_WEIGHT = 1
     PROTECT_WEIGHT = 12
 
-    def _should_move(self, game, randnum):
-        # consider moving exactly every self.ticks_per_move ticks
-        return game.current_tick % self.ticks_per_move == 0
+    FIXED_SCHEDULE = True
+
+    def _should_move(self, game, randnum, phase=0):
+        # consider moving exactly every self.ticks_per_move ticks, phase ticks before the multiples of it
+        return (game.current_tick + phase) % self.ticks_per_move == 0
 
     def _move_score_threshold(self):
         # don't consider anything too bad
         return -10
 
 
+class SearchBot(BasicBot):
+
+    # number of candidate moves searched, the best ones by the heuristic score
+    SEARCH_WIDTH = 4
+    # share of the time budget for scoring candidates with the heuristic, the rest is for rollouts
+    HEURISTIC_SHARE = 0.2
+    # rollouts play this many squares' worth of ticks past the move, enough for the exchanges it starts to play out
+    ROLLOUT_SQUARES = 4
+    # ticks between the moves of each side during a rollout
+    ROLLOUT_TICKS_PER_MOVE = 13
+    # weight of the exploration term when picking which candidate to roll out next, in units of PIECE_SCORES
+    EXPLORATION = 4
+    # share of the time budget kept back for picking the move after the rollouts and for hiccups no step has shown
+    DEADLINE_MARGIN = 0.1
+
+    # picks between the best few moves by the heuristic by playing each one out on a copy of the game, with both
+    # sides played by a BasicBot, and scoring the material left at the end. this catches what comes down to timing,
+    # like a piece getting captured on its way or running into another one. which move gets the next rollout is
+    # decided by UCB1, i.e. Monte Carlo tree search with only the first move in the tree. the time budget is spread
+    # over as many rollouts as fit. a rollout only takes its next step if even the longest step so far would end
+    # before the deadline, less DEADLINE_MARGIN, and is thrown away otherwise
+    def __init__(self, difficulty, ticks_per_move, top_n_moves, time_budget):
+        super(SearchBot, self).__init__(difficulty, ticks_per_move, top_n_moves, time_budget=time_budget)
+        self.rollout_bot = BasicBot('rollout', SearchBot.ROLLOUT_TICKS_PER_MOVE, 1)
+
+        # number of rollouts finished for the last decision
+        self.last_num_rollouts = 0
+
+        # longest it has taken to set up a rollout, or to play one forward to the next moves and make them, this
+        # decision and the one before. a step that got held up only holds back the next decision, not all later ones
+        self._max_step_time = 0
+        self._last_max_step_time = 0
+
+    # garbage collections wait until the move is picked: a full one in the middle of a rollout can take longer than
+    # any step before it, and gets longer the more games the process holds
+    def _choose_move(self, game, player):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._search(game, player)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _search(self, game, player):
+        start = time.time()
+        deadline = start + self.time_budget * (1 - self.DEADLINE_MARGIN) / 1e6
+        self._last_max_step_time, self._max_step_time = self._max_step_time, 0
+
+        candidates, scores = self._score_candidates(game, player, start + self.time_budget * self.HEURISTIC_SHARE / 1e6)
+        best_moves = [
+            (move, score) for (move, piece_occupied), score in zip(candidates, scores)
+            if score is not None and score >= self._move_score_threshold()
+        ]
+        best_moves.sort(key=lambda m: m[1], reverse=True)
+        best_moves = best_moves[:self.SEARCH_WIDTH]
+
+        num_rollouts = 0
+        if len(best_moves) > 1:
+            totals = [0.0] * len(best_moves)
+            counts = [0] * len(best_moves)
+
+            # the nth rollout of every move has the sides start moving at the same ticks, so the moves are compared
+            # under the same conditions
+            first_move_delays = []
+            while True:
+                i = self._get_next_rollout(totals, counts, num_rollouts)
+                if counts[i] == len(first_move_delays):
+                    first_move_delays.append({
+                        p: random.randint(1, self.ROLLOUT_TICKS_PER_MOVE) for p in xrange(1, game.num_players + 1)
+                    })
+
+                value = self._rollout(game, player, best_moves[i][0], first_move_delays[counts[i]], deadline)
+                if value is None:
+                    break
+
+                totals[i] += value
+                counts[i] += 1
+                num_rollouts += 1
+
+            # moves that never got played out are only picked if none were, and ties go to the better heuristic score
+            if num_rollouts > 0:
+                best = max(
+                    (i for i in xrange(len(best_moves)) if counts[i] > 0),
+                    key=lambda i: (totals[i] / counts[i], -i),
+                )
+                best_moves = [best_moves[best]]
+
+        elapsed = int((time.time() - start) * 1e6)
+        self.last_decision = (elapsed, None in scores, elapsed > self.time_budget, False)
+        self.last_num_rollouts = num_rollouts
+
+        if len(best_moves) == 0:
+            return None
+
+        return best_moves[0]
+
+    # index of the move to roll out next: any that hasn't been yet, in order, then the one with the best upper
+    # confidence bound
+    def _get_next_rollout(self, totals, counts, num_rollouts):
+        for i, count in enumerate(counts):
+            if count == 0:
+                return i
+
+        log_rollouts = math.log(num_rollouts)
+        return max(
+            xrange(len(counts)),
+            key=lambda i: totals[i] / counts[i] + self.EXPLORATION * math.sqrt(2 * log_rollouts / counts[i]),
+        )
+
+    # material balance for the player after making the move and playing on for a while, with each side making its
+    # first move after the given number of ticks, or None if it couldn't be finished before the deadline
+    def _rollout(self, game, player, move, first_move_delays, deadline):
+        # give up while there's still time for everything after, rather than going over
+        if time.time() + max(self._max_step_time, self._last_max_step_time) >= deadline:
+            return None
+
+        step_start = time.time()
+        sim = game.clone(clock=VirtualClock(start_time=game.clock.time()))
+        piece, row, col = move[:3]
+        if not sim.move(piece.id, player, row, col):
+            return self._get_material(sim, player)
+
+        end_tick = sim.current_tick + self.ROLLOUT_SQUARES * sim.move_ticks
+        next_ticks = {p: sim.current_tick + delay for p, delay in first_move_delays.iteritems()}
+        self._max_step_time = max(self._max_step_time, time.time() - step_start)
+
+        while not sim.finished:
+            if time.time() + max(self._max_step_time, self._last_max_step_time) >= deadline:
+                return None
+
+            step_start = time.time()
+            tick = min(min(next_ticks.itervalues()), end_tick)
+            sim.advance_to(tick)
+            if sim.finished or sim.current_tick >= end_tick:
+                break
+
+            for p in sorted(next_ticks):
+                if next_ticks[p] != tick:
+                    continue
+
+                next_ticks[p] += self.ROLLOUT_TICKS_PER_MOVE
+                rollout_move = self.rollout_bot._choose_move(sim, p)
+                if rollout_move is not None:
+                    piece, row, col = rollout_move[0][:3]
+                    sim.move(piece.id, p, row, col)
+
+            self._max_step_time = max(self._max_step_time, time.time() - step_start)
+
+        return self._get_material(sim, player)
+
+    # value of the player's pieces left on the board minus the opponent's; losing the king outweighs everything else
+    def _get_material(self, game, player):
+        material = 0
+        for p in game.board.pieces:
+            if not p.captured:
+                material += PIECE_SCORES[p.type] if p.player == player else -PIECE_SCORES[p.type]
+        return material
+
+
 if __name__ == '__main__':
     profile = False
 
@@ -446,7 +820,7 @@ if __name__ == '__main__':
         yappi.start()
 
     bot = get_bot('advanced')
-    game = Game(Speed('standard'), {})
+    game = Game(Speed('standard'), {1: 'b:advanced', 2: 'b:advanced'}, clock=VirtualClock())
     for i in xrange(10000):
         if game.finished:
             break
@@ -0,0 +1,106 @@
+import collections
+
+from lib.bitboard import SQUARE_INDEX, get_attacks, square_bit
+from lib.moves import KNIGHT_DIR_SET
+
+
+class PositionAnalysis(object):
+
+    # what the bots work out about the game's current position before scoring their moves, for every bot deciding in
+    # it to share: occupancy and piece locations, pressures and protects for an occupancy (the same for both sides
+    # unless they have pieces in flight) and the reach map's arrival ticks. each is worked out on first use, so in a
+    # game between bots the second bot to decide on a tick reuses what the first one worked out. the game drops its
+    # analysis on every tick, and tells it about moves started in between. results are shared, so callers mustn't
+    # modify them
+    def __init__(self, game):
+        self.game = game
+
+        self._occupancy_and_locations = {}  # player -> (occupied, piece_to_location_map)
+        self._pressures_and_protects = {}  # occupied -> (current_pressures, current_protects)
+        self._arrival_ticks = None
+
+    # called by the game when one of the player's pieces starts moving. nothing on the board changes until the next
+    # tick, so pressures and protects still hold, and so do the other player's occupancy and locations
+    def start_move(self, player):
+        self._occupancy_and_locations.pop(player, None)
+        self._arrival_ticks = None
+
+    # bitboard of occupied squares and map of piece locations, where the player's moving pieces are at their
+    # destinations
+    def get_occupancy_and_locations(self, player):
+        result = self._occupancy_and_locations.get(player)
+        if result is not None:
+            return result
+
+        game = self.game
+        occupied = game.board.get_bitboards().occupied()
+        piece_to_location_map = game.board.get_piece_to_location_map()
+
+        # for the player's own moving pieces, take into consideration the move
+        for move in game.active_moves:
+            piece = move.piece
+            if not piece.captured and piece.player == player:
+                occupied &= ~square_bit(piece.row, piece.col)
+
+        for move in game.active_moves:
+            piece = move.piece
+            if not piece.captured and piece.player == player:
+                row, col = move.move_seq[-1]
+                occupied |= square_bit(row, col)
+                piece_to_location_map[piece.id] = (row, col)
+
+        result = self._occupancy_and_locations[player] = (occupied, piece_to_location_map)
+        return result
+
+    # enemies attacking and allies protecting each piece, by piece id, with the given occupancy
+    def get_pressures_and_protects(self, occupied):
+        result = self._pressures_and_protects.get(occupied)
+        if result is not None:
+            return result
+
+        game = self.game
+        attack_map = game.board.get_attack_map()
+        attackers = attack_map.get_attackers(occupied)
+        between_squares = None
+
+        current_pressures = collections.defaultdict(list)
+        current_protects = collections.defaultdict(list)
+        for p1 in game.board.pieces:
+            square = SQUARE_INDEX.get((p1.row, p1.col))
+            if square is not None:
+                current_protects[p1.id] = attackers[p1.player][square]
+                current_pressures[p1.id] = attackers[3 - p1.player][square]
+                continue
+
+            # only knights in the air (which are between squares) can target each other, so check those directly
+            if between_squares is None:
+                between_squares = attack_map.get_pieces_between_squares()
+            for p2 in between_squares:
+                if self._can_target(occupied, p2, p1.row, p1.col):
+                    if p1.player == p2.player:
+                        current_protects[p1.id].append(p2)
+                    else:
+                        current_pressures[p1.id].append(p2)
+
+        result = self._pressures_and_protects[occupied] = (current_pressures, current_protects)
+        return result
+
+    # ticks until each piece could capture on each square, see ReachMap.get_arrival_ticks
+    def get_arrival_ticks(self):
+        if self._arrival_ticks is None:
+            self._arrival_ticks = self.game.get_reach_map().get_arrival_ticks()
+        return self._arrival_ticks
+
+    def _can_target(self, occupied, piece, t_row, t_col):
+        if t_row == piece.row and t_col == piece.col:
+            return False
+
+        # knights in the air are between squares, so check those directly
+        if piece.type == 'N':
+            return (t_row - piece.row, t_col - piece.col) in KNIGHT_DIR_SET
+
+        square = SQUARE_INDEX.get((piece.row, piece.col))
+        if square is None:
+            return False
+
+        return bool(get_attacks(piece.type, piece.player, square, occupied) & square_bit(t_row, t_col))
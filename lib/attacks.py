@@ -0,0 +1,93 @@
+from lib.bitboard import SQUARE_INDEX, get_attacks
+
+
+SLIDER_TYPES = frozenset(('B', 'R', 'Q'))
+
+
+class AttackMap(object):
+
+    # squares each piece attacks and, per player and square, the pieces attacking that square in board order.
+    # captured pieces keep attacking from where they were taken, as they always have for the bots. the board reports
+    # every change, and the map catches up lazily: pieces that changed are recomputed, plus the sliders whose attacks
+    # reach a square whose occupancy changed (nothing else can have been affected). attackers are kept as tuples, so
+    # the ones handed out stay valid and squares nothing attacks all share the empty tuple
+    def __init__(self, pieces, order, bitboards):
+        self.pieces = pieces
+        self._order = order
+        self._bitboards = bitboards
+
+        self._attacks = [0] * len(pieces)  # in board order
+        self._attackers = [None, [()] * 64, [()] * 64]
+        self._occupied = 0
+        self._dirty_pieces = {p.id: p for p in pieces}
+        self._changed_squares = 0
+
+    # called by the board after a piece moved, was captured or was promoted, with the squares whose occupancy changed
+    def update(self, piece, squares):
+        self._dirty_pieces[piece.id] = piece
+        self._changed_squares |= squares
+
+    # attackers, indexed by player and then square, with the given occupancy (the board's if not specified)
+    def get_attackers(self, occupied=None):
+        self._refresh()
+        if occupied is None or occupied == self._occupied:
+            return self._attackers
+
+        attackers = [None, list(self._attackers[1]), list(self._attackers[2])]
+        for p in self._get_sliders_through(occupied ^ self._occupied).itervalues():
+            square = SQUARE_INDEX[(p.row, p.col)]
+            self._apply(attackers, p, self._attacks[self._order[p.id]], get_attacks(p.type, p.player, square, occupied))
+        return attackers
+
+    # pieces between squares (knights in the air), in board order; these neither attack nor get attacked by the
+    # pieces on squares
+    def get_pieces_between_squares(self):
+        return [p for p in self.pieces if (p.row, p.col) not in SQUARE_INDEX]
+
+    def _refresh(self):
+        if not self._dirty_pieces and not self._changed_squares:
+            return
+
+        occupied = self._bitboards.occupied()
+        dirty_pieces = self._dirty_pieces
+        dirty_pieces.update(self._get_sliders_through(self._changed_squares))
+        for p in dirty_pieces.itervalues():
+            square = SQUARE_INDEX.get((p.row, p.col))
+            attacks = 0 if square is None else get_attacks(p.type, p.player, square, occupied)
+            i = self._order[p.id]
+            self._apply(self._attackers, p, self._attacks[i], attacks)
+            self._attacks[i] = attacks
+
+        self._occupied = occupied
+        self._dirty_pieces = {}
+        self._changed_squares = 0
+
+    # sliders whose current attacks include one of the squares, which are the only ones a change there can affect
+    def _get_sliders_through(self, squares):
+        result = {}
+        while squares:
+            bit = squares & -squares
+            squares ^= bit
+            square = bit.bit_length() - 1
+            for player in (1, 2):
+                for p in self._attackers[player][square]:
+                    if p.type in SLIDER_TYPES:
+                        result[p.id] = p
+        return result
+
+    def _apply(self, attackers, piece, old_attacks, new_attacks):
+        by_square = attackers[piece.player]
+
+        removed = old_attacks & ~new_attacks
+        while removed:
+            bit = removed & -removed
+            removed ^= bit
+            square = bit.bit_length() - 1
+            by_square[square] = tuple(p for p in by_square[square] if p is not piece)
+
+        added = new_attacks & ~old_attacks
+        while added:
+            bit = added & -added
+            added ^= bit
+            square = bit.bit_length() - 1
+            by_square[square] = tuple(sorted(by_square[square] + (piece,), key=lambda p: self._order[p.id]))
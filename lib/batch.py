@@ -0,0 +1,620 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+from lib.board import Board, Piece
+from lib.clock import TICK_PERIOD, VirtualClock
+from lib.fixedpoint import (
+    CAPTURE_DISTANCE, CONSIDER_CAPTURE_DISTANCE, get_max_distance_sq, get_position_scale, has_knight_landed, to_fixed
+)
+from lib.game import Game, Speed
+
+
+# piece types are stored as their index in Piece.ALL_TYPES
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(len(Piece.ALL_TYPES))
+
+# longest possible move sequence (starting square plus 7 steps)
+MAX_MOVE_SEQ = 8
+
+
+# positions are stored in half squares so knight midpoints fit in integers
+def _to_squares(half):
+    return half / 2 if half % 2 == 0 else half / 2.0
+
+
+def _to_half(value):
+    return int(value * 2)
+
+
+# Struct-of-arrays engine that plays many games at once with the same rules as lib/game.py.
+#
+# All games share a speed and starting board. State lives in NumPy arrays indexed by (game, piece), where the piece
+# index is the position of the piece in the starting board. Ticks are vectorized across games; the few games where an
+# active move comes within capture distance of an enemy piece fall back to an exact port of the capture pass in
+# Game.tick. Move commands are validated one at a time after vectorized pre-checks, since they are rare compared to
+# ticks. Time is virtual (TICK_PERIOD per tick), as with a VirtualClock.
+#
+# With conformance_games, a real Game is played alongside each of those games and the two are compared after every
+# command and tick.
+class BatchGame(object):
+
+    def __init__(self, num_games, speed, players, board=None, is_campaign=False, conformance_games=()):
+        board = board or Board.initial()
+
+        self.num_games = num_games
+        self.speed = speed
+        self.players = players
+        self.is_campaign = is_campaign
+        self.move_ticks = speed.get_move_ticks()
+        self.cooldown_ticks = speed.get_cooldown_ticks()
+        self.current_tick = 0
+
+        # captures are worked out on integer positions, the same as in Game
+        self.position_scale = get_position_scale(self.move_ticks)
+        self.max_consider_distance_sq = get_max_distance_sq(CONSIDER_CAPTURE_DISTANCE, self.position_scale)
+        self.max_capture_distance_sq = get_max_distance_sq(CAPTURE_DISTANCE, self.position_scale, exclusive=True)
+
+        # last move time only counts for non-bots, same as Game.move
+        self.counts_as_move = {
+            player: not value.startswith('b') and not value.startswith('c')
+            for player, value in players.iteritems()
+        }
+
+        self.piece_ids = [p.id for p in board.pieces]
+        self.piece_index = {p.id: i for i, p in enumerate(board.pieces)}
+
+        shape = (num_games, len(board.pieces))
+        self.type = np.tile(np.array([Piece.ALL_TYPES.index(p.type) for p in board.pieces], np.int8), (num_games, 1))
+        self.player = np.tile(np.array([p.player for p in board.pieces], np.int8), (num_games, 1))
+        self.row = np.tile(np.array([_to_half(p.row) for p in board.pieces], np.int8), (num_games, 1))
+        self.col = np.tile(np.array([_to_half(p.col) for p in board.pieces], np.int8), (num_games, 1))
+        self.captured = np.tile(np.array([p.captured for p in board.pieces], bool), (num_games, 1))
+        self.moved = np.tile(np.array([p.moved for p in board.pieces], bool), (num_games, 1))
+
+        # move plan of each piece; move_order keeps the order of Game.active_moves
+        self.moving = np.zeros(shape, bool)
+        self.move_start = np.zeros(shape, np.int32)
+        self.move_len = np.zeros(shape, np.int8)
+        self.move_seq = np.zeros(shape + (MAX_MOVE_SEQ, 2), np.int8)
+        self.move_order = np.zeros(shape, np.int64)
+        self.next_move_order = 0
+
+        self.cooling = np.zeros(shape, bool)
+        self.cooldown_start = np.zeros(shape, np.int32)
+
+        self.finished = np.zeros(num_games, np.int8)
+        self.last_capture_tick = np.zeros(num_games, np.int32)
+        self.last_move_tick = np.zeros(num_games, np.int32)
+
+        self.conformance_games = {}
+        for g in conformance_games:
+            pieces = [Piece(p.type, p.player, p.row, p.col, p.captured, p.moved, p.id) for p in board.pieces]
+            game = Game(speed, players, board=Board(pieces), is_campaign=is_campaign, clock=VirtualClock())
+            for player in players:
+                game.mark_ready(player)
+            self.conformance_games[g] = game
+
+    # applies a batch of move commands in order; each argument is a sequence with one entry per command
+    # returns a boolean array of which commands were valid
+    def move(self, games, pieces, players, to_rows, to_cols):
+        games, pieces, players = np.asarray(games), np.asarray(pieces), np.asarray(players)
+        to_rows, to_cols = np.asarray(to_rows), np.asarray(to_cols)
+
+        # cheap checks first, vectorized over all commands; none of these can start passing because of an
+        # earlier command in the batch, so they are safe to do up front
+        valid_piece = (pieces >= 0) & (pieces < len(self.piece_ids))
+        safe_pieces = np.where(valid_piece, pieces, 0)
+        candidates = (
+            valid_piece &
+            (self.finished[games] == 0) &
+            (self.player[games, safe_pieces] == players) &
+            ~self.captured[games, safe_pieces] &
+            (to_rows >= 0) & (to_rows < 8) & (to_cols >= 0) & (to_cols < 8) &
+            ((self.row[games, safe_pieces] != 2 * to_rows) | (self.col[games, safe_pieces] != 2 * to_cols)) &
+            ~self.moving[games, safe_pieces] &
+            ~self.cooling[games, safe_pieces] &
+            self._has_move_shape(games, safe_pieces, players, to_rows, to_cols)
+        )
+
+        accepted = np.zeros(len(games), bool)
+        checked = candidates | np.in1d(games, self.conformance_games.keys())
+        for k in np.nonzero(checked)[0].tolist():
+            g, i, player = int(games[k]), int(pieces[k]), int(players[k])
+            to_row, to_col = int(to_rows[k]), int(to_cols[k])
+
+            if candidates[k]:
+                accepted[k] = self._move(g, i, player, to_row, to_col)
+
+            game = self.conformance_games.get(g)
+            if game is not None and not game.finished:
+                expected = game.move(self.piece_ids[i], player, to_row, to_col) is not None
+                if expected != accepted[k]:
+                    raise RuntimeError('batch game %s diverged from Game on move %s %s %s %s at tick %s' % (
+                        g, self.piece_ids[i], player, to_row, to_col, self.current_tick
+                    ))
+
+        return accepted
+
+    # whether each piece could reach its destination on an empty board, ignoring blocking and timing
+    def _has_move_shape(self, games, pieces, players, to_rows, to_cols):
+        types = self.type[games, pieces]
+        rows = self.row[games, pieces].astype(np.int32)
+        row_delta = 2 * to_rows - rows
+        col_delta = 2 * to_cols - self.col[games, pieces]
+        abs_row_delta, abs_col_delta = np.abs(row_delta), np.abs(col_delta)
+
+        diagonal = abs_row_delta == abs_col_delta
+        straight = (row_delta == 0) | (col_delta == 0)
+        row_dir = np.where(players == 1, -2, 2)
+        double_step = ((players == 1) & (rows == 12) & (to_rows == 4)) | ((players == 2) & (rows == 2) & (to_rows == 3))
+        castle = ~self.moved[games, pieces] & (row_delta == 0) & ((to_cols == 2) | (to_cols == 6))
+
+        return np.select(
+            [types == PAWN, types == KNIGHT, types == BISHOP, types == ROOK, types == QUEEN, types == KING],
+            [
+                ((row_delta == row_dir) & (abs_col_delta <= 2)) | (double_step & (col_delta == 0)),
+                ((abs_row_delta == 2) & (abs_col_delta == 4)) | ((abs_row_delta == 4) & (abs_col_delta == 2)),
+                diagonal,
+                straight,
+                diagonal | straight,
+                ((abs_row_delta <= 2) & (abs_col_delta <= 2)) | castle,
+            ],
+        )
+
+    def _move(self, g, i, player, to_row, to_col):
+        view = _GameView(self, g)
+        moves = view.validate_move(i, player, to_row, to_col)
+        if moves is None:
+            return False
+
+        for j, move_seq in moves:
+            self.moving[g, j] = True
+            self.moved[g, j] = True
+            self.move_start[g, j] = self.current_tick + 1
+            self.move_len[g, j] = len(move_seq)
+            self.move_seq[g, j, :len(move_seq)] = [(_to_half(row), _to_half(col)) for row, col in move_seq]
+            self.move_order[g, j] = self.next_move_order
+            self.next_move_order += 1
+
+        if self.counts_as_move[player]:
+            self.last_move_tick[g] = self.current_tick
+
+        return True
+
+    # one tick of every unfinished game passing, returns the status of each game (same values as Game.tick)
+    def tick(self):
+        self.current_tick += 1
+        current_tick = self.current_tick
+        active = (self.finished == 0)[:, None]
+
+        # resolve all movements
+        stepping = self.moving & active
+        tick_delta = current_tick - self.move_start
+        movements = np.minimum(tick_delta / self.move_ticks, MAX_MOVE_SEQ - 1)[:, :, None]
+        self.row = np.where(stepping, np.take_along_axis(self.move_seq[:, :, :, 0], movements, 2)[:, :, 0], self.row)
+        self.col = np.where(stepping, np.take_along_axis(self.move_seq[:, :, :, 1], movements, 2)[:, :, 0], self.col)
+
+        # promote pawn to queen
+        promoted = stepping & (self.type == PAWN) & (
+            ((self.player == 1) & (self.row == 0)) | ((self.player == 2) & (self.row == 14))
+        )
+        self.type[promoted] = QUEEN
+
+        # resolve all captures
+        for g in self._get_games_with_possible_captures(stepping, current_tick):
+            self._resolve_captures(g, current_tick)
+
+        # remove moves that have ended
+        ended = stepping & ~self.captured & (tick_delta >= self.move_ticks * (self.move_len.astype(np.int32) - 1))
+        expired = self.cooling & active & (self.captured | (current_tick - self.cooldown_start >= self.cooldown_ticks))
+        self.moving &= ~(stepping & self.captured) & ~ended
+        self.cooling &= ~expired
+        self.cooling |= ended
+        self.cooldown_start[ended] = current_tick
+
+        # someone's king has been captured, so the game is over
+        kings_captured = active & self.captured & (self.type == KING)
+        games_won = np.nonzero(kings_captured.any(axis=1))[0]
+        first_king = kings_captured[games_won].argmax(axis=1)
+        self.finished[games_won] = np.where(self.player[games_won, first_king] == 2, 1, 2)
+
+        # too long without a capture or player move, consider it a draw
+        time_since_move = (current_tick * TICK_PERIOD) - (self.last_move_tick * TICK_PERIOD)
+        if self.is_campaign:
+            draws = time_since_move >= Game.CAMPAIGN_NO_MOVE_TIMEOUT
+        else:
+            draws = (
+                (current_tick >= Game.MIN_DRAW_TICKS[self.speed.value]) &
+                (current_tick - self.last_capture_tick > Game.DRAW_LIMITS[self.speed.value]) &
+                (time_since_move >= Game.NO_MOVE_TIMEOUTS[self.speed.value])
+            )
+        self.finished[(self.finished == 0) & active[:, 0] & draws] = -1
+
+        for g, game in self.conformance_games.items():
+            if not game.finished:
+                game.tick()
+                self._check_conformance(g, game)
+
+        return self.finished.copy()
+
+    # broad phase for captures: games where some active move is within capture distance of an enemy piece
+    def _get_games_with_possible_captures(self, stepping, current_tick):
+        mt = self.move_ticks
+        tick_delta = current_tick - self.move_start
+        last = np.maximum(self.move_len.astype(np.int32) - 1, 0)
+        airborne = stepping & (self.type == KNIGHT) & (tick_delta < mt * last - mt / 2)
+
+        # interpolated positions for moving pieces, in the units of lib/fixedpoint.py: half squares are 2 * mt units
+        # across, and each tick of a movement covers 2 units for every half square the movement goes
+        movements = np.minimum(tick_delta / mt, last)
+        next_movements = np.minimum(movements + 1, last)
+        progress = 2 * (tick_delta % mt)
+        positions = []
+        for axis, static in ((0, self.row), (1, self.col)):
+            seq = self.move_seq[:, :, :, axis]
+            pos1 = np.take_along_axis(seq, movements[:, :, None], 2)[:, :, 0].astype(np.int32)
+            pos2 = np.take_along_axis(seq, next_movements[:, :, None], 2)[:, :, 0].astype(np.int32)
+            moving_position = pos1 * 2 * mt + (pos2 - pos1) * progress
+            positions.append(np.where(stepping, moving_position, static.astype(np.int32) * 2 * mt))
+        row, col = positions
+
+        targets = ~self.captured & ~airborne
+        games, attackers = np.nonzero(stepping & targets)
+        if len(games) == 0:
+            return []
+
+        # positions are the exact ones of the narrow phase, so no margin is needed on its threshold
+        row_delta = row[games] - row[games, attackers][:, None]
+        col_delta = col[games] - col[games, attackers][:, None]
+        near = (
+            (row_delta * row_delta + col_delta * col_delta <= self.max_consider_distance_sq) &
+            targets[games] &
+            (self.player[games] != self.player[games, attackers][:, None])
+        )
+        return np.unique(games[near.any(axis=1)]).tolist()
+
+    # narrow phase for one game, a direct port of the capture pass in Game.tick
+    def _resolve_captures(self, g, current_tick):
+        view = _GameView(self, g)
+        positions = {}
+        for j in xrange(len(view.types)):
+            if view.captured[j]:
+                continue
+
+            if view.moving[j]:
+                position = view.get_fixed_position(j, 2 * current_tick)
+                if position is None:
+                    continue
+            else:
+                position = to_fixed(view.rows[j], self.position_scale), to_fixed(view.cols[j], self.position_scale)
+            positions[j] = position
+
+        active_moves = sorted((j for j in xrange(len(view.types)) if view.moving[j]), key=lambda j: view.order[j])
+        for i in active_moves:
+            if view.captured[i] or i not in positions:
+                continue
+
+            row, col = positions[i]
+            seq = view.seqs[i]
+            for j in xrange(len(view.types)):
+                if view.players[j] == view.players[i] or view.captured[j] or j not in positions:
+                    continue
+
+                other_row, other_col = positions[j]
+
+                # threshold for considering capture (half square diagonal is max distance)
+                dist_sq = (row - other_row) ** 2 + (col - other_col) ** 2
+                if dist_sq > self.max_consider_distance_sq:
+                    continue
+
+                # knights can only capture at the end of their move
+                if view.types[i] == 'N' and not has_knight_landed(current_tick - view.starts[i], self.move_ticks):
+                    continue
+
+                # if the other piece is static and we're close enough, capture it
+                if not view.moving[j]:
+                    if dist_sq <= self.max_capture_distance_sq:
+                        if view.types[i] == 'P' and seq[0][1] == seq[-1][1]:
+                            view.captured[i] = True
+                        else:
+                            view.captured[j] = True
+                        self.last_capture_tick[g] = current_tick
+                        break
+
+                    continue
+
+                # check distance after a half-tick
+                n_row, n_col = view.get_fixed_position(i, 2 * current_tick + 1)
+                n_dist_sq = (n_row - other_row) ** 2 + (n_col - other_col) ** 2
+
+                # check other distince after a half-tick
+                n_other_row, n_other_col = view.get_fixed_position(j, 2 * current_tick + 1)
+                n_other_dist_sq = (row - n_other_row) ** 2 + (col - n_other_col) ** 2
+
+                # one of these has to be within the true capture threshold to consider a capture
+                if min(dist_sq, n_dist_sq, n_other_dist_sq) > self.max_capture_distance_sq:
+                    continue
+
+                # pawns not moving diagonally cannot capture, so they always get captured on collision
+                if view.types[i] == 'P' and seq[0][1] == seq[-1][1]:
+                    other_seq = view.seqs[j]
+                    if (
+                        view.types[j] != 'P' or
+                        other_seq[0][1] != other_seq[-1][1] or
+                        view.starts[j] < view.starts[i]
+                    ):
+                        view.captured[i] = True
+                        self.last_capture_tick[g] = current_tick
+                        break
+
+                    continue
+
+                captured = False
+                if n_dist_sq < dist_sq and n_other_dist_sq > dist_sq:
+                    # piece is moving closer, other piece is moving away
+                    captured = True
+                elif n_dist_sq > dist_sq and n_other_dist_sq < dist_sq:
+                    # other_piece captures, let that piece trigger it
+                    pass
+                else:
+                    # both are moving away or moving closer, the earlier moving piece wins
+                    if view.starts[i] <= view.starts[j]:
+                        captured = True
+
+                if captured:
+                    self.last_capture_tick[g] = current_tick
+                    view.captured[j] = True
+                    break
+
+        self.captured[g] = view.captured
+
+    def _check_conformance(self, g, game):
+        view = _GameView(self, g)
+        expected = (
+            [(p.type, p.player, p.row, p.col, p.captured, p.moved) for p in game.board.pieces],
+            sorted((self.piece_index[m.piece.id], m.starting_tick, tuple(m.move_seq)) for m in game.active_moves),
+            sorted((self.piece_index[c.piece.id], c.starting_tick) for c in game.cooldowns),
+            game.finished,
+            game.last_capture_tick,
+        )
+        actual = (
+            zip(view.types, view.players, view.rows, view.cols, view.captured, view.moved),
+            sorted((j, view.starts[j], tuple(view.seqs[j])) for j in xrange(len(view.types)) if view.moving[j]),
+            sorted((j, int(self.cooldown_start[g, j])) for j in np.nonzero(self.cooling[g])[0]),
+            int(self.finished[g]),
+            int(self.last_capture_tick[g]),
+        )
+        if expected != actual:
+            raise RuntimeError('batch game %s diverged from Game at tick %s' % (g, self.current_tick))
+
+
+class _GameView(object):
+    # plain Python copy of one game in a BatchGame, for the parts of the rules that are inherently sequential;
+    # the move validators mirror those in Game but work on piece indexes
+
+    def __init__(self, batch, g):
+        self.move_ticks = batch.move_ticks
+        self.position_scale = batch.position_scale
+        self.current_tick = batch.current_tick
+        self.types = [Piece.ALL_TYPES[t] for t in batch.type[g].tolist()]
+        self.players = batch.player[g].tolist()
+        self.rows = (batch.row[g] >> 1).tolist()
+        self.cols = (batch.col[g] >> 1).tolist()
+        for j in np.nonzero((batch.row[g] | batch.col[g]) & 1)[0].tolist():
+            # only knights in the air (or captured there) are between squares
+            self.rows[j], self.cols[j] = _to_squares(batch.row[g, j]), _to_squares(batch.col[g, j])
+        self.captured = batch.captured[g].tolist()
+        self.moved = batch.moved[g].tolist()
+        self.moving = batch.moving[g].tolist()
+        self.cooling = batch.cooling[g].tolist()
+        self.starts = batch.move_start[g].tolist()
+        self.order = batch.move_order[g].tolist()
+
+        self.seqs = {}
+        for j in np.nonzero(batch.moving[g])[0].tolist():
+            move_seq = batch.move_seq[g, j, :batch.move_len[g, j]].tolist()
+            self.seqs[j] = [(_to_squares(row), _to_squares(col)) for row, col in move_seq]
+
+        self.locations = {}
+        for j in xrange(len(self.types)):
+            if not self.captured[j]:
+                self.locations.setdefault((self.rows[j], self.cols[j]), j)
+
+    def get_piece_by_location(self, row, col):
+        return self.locations.get((row, col))
+
+    # same as Game._get_fixed_position
+    def get_fixed_position(self, j, half_tick):
+        seq = self.seqs[j]
+        movement_half_ticks = 2 * self.move_ticks
+        total_half_ticks = movement_half_ticks * (len(seq) - 1)
+        half_ticks = half_tick - 2 * self.starts[j]
+        if self.types[j] == 'N' and half_ticks < total_half_ticks - 2 * (self.move_ticks / 2):
+            return None
+
+        movements = half_ticks / movement_half_ticks
+        if movements >= len(seq) - 1:
+            return to_fixed(seq[-1][0], self.position_scale), to_fixed(seq[-1][1], self.position_scale)
+
+        (row1, col1), (row2, col2) = seq[movements], seq[movements + 1]
+        progress = half_ticks % movement_half_ticks
+        return (
+            to_fixed(row1, self.position_scale) + int((row2 - row1) * 2) * progress,
+            to_fixed(col1, self.position_scale) + int((col2 - col1) * 2) * progress,
+        )
+
+    # returns a list of (piece index, move sequence) to start, or None if the move is invalid
+    def validate_move(self, i, player, to_row, to_col):
+        if self.players[i] != player or self.captured[i]:
+            return None
+
+        if to_row < 0 or to_row >= 8 or to_col < 0 or to_col >= 8:
+            return None
+
+        if self.rows[i] == to_row and self.cols[i] == to_col:
+            return None
+
+        if self.moving[i] or self.cooling[i]:
+            return None
+
+        move_seq_fn = {
+            'P': self._get_pawn_move_seq,
+            'N': self._get_knight_move_seq,
+            'B': self._get_bishop_move_seq,
+            'R': self._get_rook_move_seq,
+            'Q': self._get_queen_move_seq,
+            'K': self._get_king_move_seq,
+        }[self.types[i]]
+        move_seq_res = move_seq_fn(i, to_row, to_col)
+        if not move_seq_res:
+            return None
+
+        move_seq, extra_move = move_seq_res
+        moves = [(i, [(self.rows[i], self.cols[i])] + move_seq)]
+        if extra_move:
+            moves.append(extra_move)
+        return moves
+
+    def _get_pawn_move_seq(self, i, to_row, to_col):
+        row, col, player = self.rows[i], self.cols[i], self.players[i]
+
+        can_capture = True
+        row_dir = Game.PLAYER_DIRECTION[player]
+        steps = abs(to_row - row)
+        if to_row - row != row_dir:
+            if player == 1 and row == 6 and to_row == 4:
+                can_capture = False
+            elif player == 2 and row == 1 and to_row == 3:
+                can_capture = False
+            else:
+                return None
+
+        if col == to_col:
+            move_seq = self._get_move_seq_ensuring_no_cross(i, row_dir, 0, steps, capture=False)
+            if move_seq is not None:
+                return move_seq
+
+        if can_capture and (col + 1 == to_col or col - 1 == to_col):
+            dest = self.get_piece_by_location(to_row, to_col)
+            if dest is not None and self.players[dest] != player and not self.moving[dest]:
+                move_seq = self._get_move_seq_ensuring_no_cross(i, row_dir, to_col - col, 1)
+                if move_seq is not None:
+                    return move_seq
+
+        return None
+
+    def _get_knight_move_seq(self, i, to_row, to_col):
+        row, col = self.rows[i], self.cols[i]
+        row_delta, col_delta = abs(to_row - row), abs(to_col - col)
+        if {row_delta, col_delta} != {1, 2}:
+            return None
+
+        if self._get_move_seq_ensuring_no_cross(i, to_row - row, to_col - col, 1) is None:
+            return None
+
+        return [(float(to_row + row) / 2, float(to_col + col) / 2), (to_row, to_col)], None
+
+    def _get_bishop_move_seq(self, i, to_row, to_col):
+        row_delta, col_delta = abs(to_row - self.rows[i]), abs(to_col - self.cols[i])
+        if row_delta != col_delta:
+            return None
+
+        row_dir = (to_row - self.rows[i]) / row_delta
+        col_dir = (to_col - self.cols[i]) / col_delta
+        return self._get_move_seq_ensuring_no_cross(i, row_dir, col_dir, row_delta)
+
+    def _get_rook_move_seq(self, i, to_row, to_col):
+        row_delta, col_delta = abs(to_row - self.rows[i]), abs(to_col - self.cols[i])
+        if row_delta != 0 and col_delta != 0:
+            return None
+
+        row_dir = (to_row - self.rows[i]) / row_delta if row_delta > 0 else 0
+        col_dir = (to_col - self.cols[i]) / col_delta if col_delta > 0 else 0
+        return self._get_move_seq_ensuring_no_cross(i, row_dir, col_dir, max(row_delta, col_delta))
+
+    def _get_queen_move_seq(self, i, to_row, to_col):
+        return self._get_bishop_move_seq(i, to_row, to_col) or self._get_rook_move_seq(i, to_row, to_col)
+
+    def _get_king_move_seq(self, i, to_row, to_col):
+        row, col = self.rows[i], self.cols[i]
+        row_delta, col_delta = abs(to_row - row), abs(to_col - col)
+        if row_delta > 1 or col_delta > 1:
+            if not self.moved[i] and row_delta == 0 and (to_col == 6 or to_col == 2):
+                rook_col = 0 if to_col == 2 else 7
+                rook_to_col = 3 if to_col == 2 else 5
+                rook = self.get_piece_by_location(row, rook_col)
+                if rook is not None and not self.moved[rook]:
+                    king_move_seq = self._get_rook_move_seq(i, to_row, to_col)
+                    rook_move_seq = self._get_rook_move_seq(rook, to_row, rook_to_col)
+                    if king_move_seq and rook_move_seq:
+                        rook_move_seq = [(self.rows[rook], self.cols[rook])] + rook_move_seq[0]
+                        return king_move_seq[0], (rook, rook_move_seq)
+
+            return None
+
+        return self._get_queen_move_seq(i, to_row, to_col)
+
+    def _get_move_seq_ensuring_no_cross(self, i, row_dir, col_dir, steps, capture=True):
+        player = self.players[i]
+        same_player_moves = [j for j in self.seqs if self.players[j] == player]
+
+        moves = []
+        for step in xrange(1, steps + 1):
+            i_row, i_col = self.rows[i] + row_dir * step, self.cols[i] + col_dir * step
+            moves.append((i_row, i_col))
+
+            # check for not moving pieces
+            j = self.get_piece_by_location(i_row, i_col)
+            if (
+                j is not None and
+                not self.moving[j] and
+                (not capture or step != steps or self.players[j] == player)
+            ):
+                return None
+
+            # check for same player's moving pieces
+            for j in same_player_moves:
+                if self.seqs[j][-1] == (i_row, i_col):
+                    return None
+
+        # the destination cannot be on the future path of any of the same player's moves
+        for j in same_player_moves:
+            tick_delta = self.current_tick - self.starts[j]
+            movements = (tick_delta + self.move_ticks - 1) / self.move_ticks
+            for row, col in self.seqs[j][movements:]:
+                if i_row == row and i_col == col:
+                    return None
+
+        return moves, None
+
+
+if __name__ == '__main__':
+    # plays random commands across many games, checking a sample against Game
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    speed = Speed(sys.argv[2] if len(sys.argv) > 2 else Speed.LIGHTNING)
+    random.seed(0)
+
+    batch = BatchGame(num_games, speed, {1: 'b:random', 2: 'b:random'}, conformance_games=range(0, num_games, 50))
+    num_pieces = len(batch.piece_ids)
+
+    start = time.time()
+    ticks = 0
+    while not batch.finished.all() and ticks < 3000:
+        commands = num_games / 4
+        games = np.random.randint(0, num_games, commands)
+        pieces = np.random.randint(0, num_pieces, commands)
+        batch.move(
+            games, pieces, batch.player[games, pieces],
+            np.random.randint(0, 8, commands), np.random.randint(0, 8, commands)
+        )
+        batch.tick()
+        ticks += 1
+
+    elapsed = time.time() - start
+    print '%s games, %s ticks in %.2fs (%.0f game ticks/s)' % (num_games, ticks, elapsed, num_games * ticks / elapsed)
+    print 'white wins %s, black wins %s, draws %s, unfinished %s' % (
+        (batch.finished == 1).sum(), (batch.finished == 2).sum(), (batch.finished == -1).sum(),
+        (batch.finished == 0).sum(),
+    )
@@ -0,0 +1,349 @@
+import json
+import os
+import random
+import sys
+import time
+import types
+
+from lib import ai
+from lib.clock import VirtualClock
+from lib.game import Game, Speed
+from lib.replay import Replay
+
+
+# total size of everything reachable from objs, counting shared objects (like interned strings) only once
+def _get_deep_size(objs):
+    seen = set()
+    size = 0
+    stack = list(objs)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType)):
+            continue
+
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, types.MethodType):
+            stack.append(obj.im_self)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+
+    return size
+
+
+def _play(game, bots, ticks):
+    for i in xrange(ticks):
+        if game.finished:
+            break
+
+        for player, bot in bots.iteritems():
+            move = bot.get_move(game, player, random.randint(0, 9999))
+            if move:
+                piece, row, col = move
+                game.move(piece.id, player, row, col)
+
+        game.tick()
+
+
+# bytes per live game, measured over a number of bot games played for a fixed number of ticks
+def memory(num_games=20, ticks=1500):
+    random.seed(0)
+    games = []
+    for i in xrange(num_games):
+        game = Game(Speed(Speed.STANDARD), {1: 'b:advanced', 2: 'b:advanced'}, clock=VirtualClock())
+        _play(game, {1: ai.get_bot('advanced'), 2: ai.get_bot('advanced')}, ticks)
+        games.append(game)
+
+    moves = sum(len(game.move_log) for game in games)
+    return _get_deep_size(games) / num_games, float(moves) / num_games
+
+
+# bot decisions per second, timed on positions taken from the middle of bot games
+def decisions(num_positions=10, ticks=300, repeat=20):
+    random.seed(0)
+    positions = []
+    for i in xrange(num_positions):
+        game = Game(Speed(Speed.STANDARD), {1: 'b:advanced', 2: 'b:advanced'}, clock=VirtualClock())
+        _play(game, {1: ai.get_bot('advanced'), 2: ai.get_bot('advanced')}, ticks)
+        positions.append(game)
+
+    # a bot that decides on every call, working out every decision from scratch
+    bot = ai.BasicBot('advanced', 1, 1, decision_cache_size=0)
+    count = 0
+    start = time.time()
+    for game in positions:
+        for i in xrange(repeat):
+            for player in (1, 2):
+                game._analysis = None
+                bot.get_move(game, player, 0)
+                count += 1
+
+    return count / (time.time() - start)
+
+
+# checks the vectorized bot scorer against the one move at a time scorer on positions from bot games, and times both
+def scoring(num_positions=10, ticks=300, repeat=10):
+    random.seed(0)
+    bots = [ai.get_bot('advanced'), ai.get_bot('campaign')]
+    inputs = []
+    for i in xrange(num_positions):
+        game = Game(Speed(Speed.STANDARD), {1: 'b:advanced', 2: 'b:advanced'}, clock=VirtualClock())
+        _play(game, {1: ai.get_bot('advanced'), 2: ai.get_bot('advanced')}, ticks)
+        for player in (1, 2):
+            for bot in bots:
+                occupied, piece_to_location_map = bot._get_occupancy_and_locations(game, player)
+                current_pressures, current_protects = bot._compute_current_pressures_and_protects(game, occupied)
+                scored_pieces = bot._get_scored_pieces(
+                    game, current_pressures, current_protects, piece_to_location_map
+                )
+                candidates = bot._get_candidates(game, player, occupied, piece_to_location_map)
+                inputs.append((bot, game, current_pressures, current_protects, scored_pieces, candidates))
+
+    def score_one_at_a_time(bot, game, current_pressures, current_protects, scored_pieces, candidates):
+        return [
+            bot._get_score(game, current_pressures, current_protects, scored_pieces, occupied, move)
+            for move, occupied in candidates
+        ]
+
+    mismatches = 0
+    for args in inputs:
+        bot, candidates = args[0], args[-1]
+        expected = bot._get_best_moves(candidates, score_one_at_a_time(*args))
+        if bot._get_best_moves(candidates, bot._get_scores(*args[1:])) != expected:
+            mismatches += 1
+
+    times = []
+    for score in (score_one_at_a_time, lambda bot, *args: bot._get_scores(*args)):
+        start = time.time()
+        for i in xrange(repeat):
+            for args in inputs:
+                score(*args)
+        times.append((time.time() - start) / (repeat * len(inputs)))
+
+    return len(inputs), mismatches, times[0], times[1]
+
+
+# share of decisions answered by the decision cache over a number of bot games, for each difficulty, along with the
+# decisions per second with the cache and without. like in a bot pool worker, one bot decides for every game
+def cache(num_games=10, ticks=1500):
+    results = []
+    for difficulty in ('novice', 'intermediate', 'advanced'):
+        rates = []
+        for decision_cache_size in (ai.DECISION_CACHE_SIZE, 0):
+            # without a time budget, so both runs make the same decisions
+            bot = ai.get_bot(difficulty)
+            bot.time_budget = None
+            bot.decision_cache_size = decision_cache_size
+
+            random.seed(0)
+            decision_time = 0
+            for i in xrange(num_games):
+                game = Game(Speed(Speed.STANDARD), {1: 'b:' + difficulty, 2: 'b:' + difficulty}, clock=VirtualClock())
+                for j in xrange(ticks):
+                    if game.finished:
+                        break
+
+                    for player in (1, 2):
+                        num_decisions = bot.num_cache_hits + bot.num_cache_misses
+                        move = bot.get_move(game, player, random.randint(0, 9999))
+                        if bot.num_cache_hits + bot.num_cache_misses > num_decisions:
+                            decision_time += bot.last_decision[0]
+                        if move:
+                            piece, row, col = move
+                            game.move(piece.id, player, row, col)
+
+                    game.tick()
+
+            num_decisions = bot.num_cache_hits + bot.num_cache_misses
+            rates.append(num_decisions / (decision_time / 1e6))
+            if decision_cache_size:
+                hit_share = float(bot.num_cache_hits) / num_decisions
+        results.append((difficulty, hit_share, rates[0], rates[1]))
+
+    return results
+
+
+# decisions per second in bot games where both bots decide on every tick, with the bots sharing the analysis of each
+# position (see lib/analysis.py) and with every decision working it out afresh
+def shared(num_games=5, ticks=1000):
+    rates = []
+    for share in (True, False):
+        random.seed(0)
+        bots = {player: ai.BasicBot('advanced', 1, 1, decision_cache_size=0) for player in (1, 2)}
+        num_decisions = 0
+        decision_time = 0
+        for i in xrange(num_games):
+            game = Game(Speed(Speed.STANDARD), {1: 'b:advanced', 2: 'b:advanced'}, clock=VirtualClock())
+            for j in xrange(ticks):
+                if game.finished:
+                    break
+
+                for player, bot in bots.iteritems():
+                    if not share:
+                        game._analysis = None
+
+                    start = time.time()
+                    move = bot.get_move(game, player, 0)
+                    decision_time += time.time() - start
+                    num_decisions += 1
+                    if move:
+                        piece, row, col = move
+                        game.move(piece.id, player, row, col)
+
+                game.tick()
+
+        rates.append(num_decisions / decision_time)
+
+    return rates
+
+
+# results of the search bot against the advanced bot, playing each side in turn, how long its decisions took
+# (including those that didn't come up with a move) and how many of them played moves out
+def search(num_games=16, ticks=6000):
+    random.seed(0)
+    results = {'win': 0, 'loss': 0, 'draw': 0}
+    decision_times = []
+    num_searched = 0
+    for i in xrange(num_games):
+        player = 1 + i % 2
+        bots = {player: ai.get_experimental_bot('expert'), 3 - player: ai.get_bot('advanced')}
+        game = Game(Speed(Speed.STANDARD), {player: 'b:expert', 3 - player: 'b:advanced'}, clock=VirtualClock())
+        for j in xrange(ticks):
+            if game.finished:
+                break
+
+            for p, bot in bots.iteritems():
+                last_decision = bot.last_decision
+                move = bot.get_move(game, p, random.randint(0, 9999))
+                if p == player and bot.last_decision is not last_decision:
+                    decision_times.append(bot.last_decision[0])
+                    num_searched += bot.last_num_rollouts > 0
+                if move:
+                    piece, row, col = move
+                    game.move(piece.id, p, row, col)
+
+            game.tick()
+
+        if game.finished == player:
+            results['win'] += 1
+        elif game.finished == 3 - player:
+            results['loss'] += 1
+        else:
+            results['draw'] += 1
+
+    decision_times.sort()
+    return (
+        results, decision_times[len(decision_times) / 2], decision_times[-1],
+        ai.get_experimental_bot('expert').time_budget, num_searched, len(decision_times),
+    )
+
+
+# random-move games at both speeds recorded on the engine from before captures were worked out on fixed-point
+# positions (see lib/fixedpoint.py), one per line: the replay, the pieces captured on each tick, the final board and
+# how the game finished
+FLOAT_ENGINE_REPLAYS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'float_engine_replays.jsonl')
+
+
+# the pieces captured on each tick and the final board of a game played from the replay, and the seconds its ticks took
+def _play_replay(replay):
+    game = Game(Speed(replay.speed), replay.players, clock=VirtualClock())
+    captures = []
+    captured = set()
+    tick_time = 0
+    for i in xrange(replay.ticks):
+        # replay moves are logged at the tick they start on, which is the one after they're made
+        for move in replay.moves_by_tick[game.current_tick + 1]:
+            game.move(move.piece_id, move.player, move.row, move.col)
+
+        start = time.time()
+        game.tick()
+        tick_time += time.time() - start
+
+        now_captured = {p.id for p in game.board.pieces if p.captured}
+        if now_captured != captured:
+            captures.append([game.current_tick, sorted(now_captured - captured)])
+            captured = now_captured
+
+    board = sorted([p.id, p.row, p.col, p.captured] for p in game.board.pieces)
+    return captures, board, game.finished, tick_time
+
+
+# the games recorded on the float engine played again on this one, checking that every capture happens on the same
+# tick and that each game ends the same way. returns the number of games that differed, out of how many, the number
+# of captures checked, and the replays' ticks per second
+def replays():
+    mismatches = 0
+    num_games = 0
+    num_captures = 0
+    num_ticks = 0
+    tick_time = 0
+    with open(FLOAT_ENGINE_REPLAYS) as f:
+        for line in f:
+            recorded = json.loads(line)
+            replay = Replay.from_json_obj(recorded['replay'])
+            captures, board, finished, game_tick_time = _play_replay(replay)
+            if (captures, board, finished) != (recorded['captures'], recorded['board'], recorded['finished']):
+                mismatches += 1
+
+            num_games += 1
+            num_captures += sum(len(piece_ids) for tick, piece_ids in recorded['captures'])
+            num_ticks += replay.ticks
+            tick_time += game_tick_time
+
+    return mismatches, num_games, num_captures, num_ticks / tick_time
+
+if __name__ == '__main__':
+    benchmark = sys.argv[1] if len(sys.argv) > 1 else 'memory'
+
+    # bots print their moves, which would drown out the results
+    stdout, sys.stdout = sys.stdout, open('/dev/null', 'w')
+    if benchmark == 'memory':
+        bytes_per_game, moves_per_game = memory()
+        sys.stdout = stdout
+        print '%d bytes per live game (%.1f logged moves per game)' % (bytes_per_game, moves_per_game)
+    elif benchmark == 'decisions':
+        decisions_per_second = decisions()
+        sys.stdout = stdout
+        print '%.1f bot decisions per second' % decisions_per_second
+    elif benchmark == 'scoring':
+        num_decisions, mismatches, scalar_time, vectorized_time = scoring()
+        sys.stdout = stdout
+        print '%d of %d decisions picked from different moves' % (mismatches, num_decisions)
+        print 'scoring took %.0fus one move at a time, %.0fus vectorized' % (scalar_time * 1e6, vectorized_time * 1e6)
+    elif benchmark == 'cache':
+        results = cache()
+        sys.stdout = stdout
+        for difficulty, hit_share, cached_rate, uncached_rate in results:
+            print '%s: %.1f%% of decisions from the cache, %.1f decisions per second with it, %.1f without' % (
+                difficulty, hit_share * 100, cached_rate, uncached_rate
+            )
+    elif benchmark == 'shared':
+        shared_rate, unshared_rate = shared()
+        sys.stdout = stdout
+        print '%.1f decisions per second sharing the analysis, %.1f without' % (shared_rate, unshared_rate)
+    elif benchmark == 'search':
+        results, median_time, max_time, time_budget, num_searched, num_decisions = search()
+        sys.stdout = stdout
+        print 'search bot against advanced: %(win)d won, %(loss)d lost, %(draw)d drawn' % results
+        print 'decisions took %dus (median), %dus (max) with a %dus budget' % (median_time, max_time, time_budget)
+        print '%d of %d decisions played moves out' % (num_searched, num_decisions)
+    elif benchmark == 'replays':
+        mismatches, num_games, num_captures, ticks_per_second = replays()
+        sys.stdout = stdout
+        print '%d of %d games differed from the float engine (%d captures checked)' % (
+            mismatches, num_games, num_captures
+        )
+        print '%.0f ticks per second replaying' % ticks_per_second
+    else:
+        sys.stdout = stdout
+        print 'Unknown benchmark ' + benchmark
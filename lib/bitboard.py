@@ -0,0 +1,145 @@
+import numpy as np
+
+from lib.moves import BISHOP_DIRS, KING_TARGETS, KNIGHT_TARGETS, PAWN_CAPTURES, RAYS, ROOK_DIRS
+
+
+# squares are numbered row * 8 + col, and a bitboard has bit (1 << square) set for each square in it
+SQUARE_INDEX = {(row, col): row * 8 + col for row in xrange(8) for col in xrange(8)}
+SQUARE_BITS = {(row, col): 1 << square for (row, col), square in SQUARE_INDEX.iteritems()}
+
+
+def square_bit(row, col):
+    # 0 for positions between squares (knights in the air), which never attack or get attacked along lines
+    return SQUARE_BITS.get((row, col), 0)
+
+
+def to_bitboard(squares):
+    result = 0
+    for row, col in squares:
+        result |= SQUARE_BITS.get((row, col), 0)
+    return result
+
+
+def _build(targets):
+    return [to_bitboard(targets[square / 8][square % 8]) for square in xrange(64)]
+
+
+KNIGHT_ATTACKS = _build(KNIGHT_TARGETS)
+KING_ATTACKS = _build(KING_TARGETS)
+PAWN_ATTACKS = [None, _build(PAWN_CAPTURES[1]), _build(PAWN_CAPTURES[2])]
+
+# RAY_MASKS[square] is a list of (ray mask, whether the ray goes toward higher squares) per direction
+BISHOP_RAY_MASKS = [
+    [(to_bitboard(RAYS[square / 8][square % 8][d]), d[0] * 8 + d[1] > 0) for d in BISHOP_DIRS] for square in xrange(64)
+]
+ROOK_RAY_MASKS = [
+    [(to_bitboard(RAYS[square / 8][square % 8][d]), d[0] * 8 + d[1] > 0) for d in ROOK_DIRS] for square in xrange(64)
+]
+
+
+# squares attacked along the rays, up to and including the first occupied square on each
+def _get_slider_attacks(ray_masks, occupied):
+    attacks = 0
+    for ray, ascending in ray_masks:
+        blockers = ray & occupied
+        if blockers:
+            if ascending:
+                ray &= ((blockers & -blockers) << 1) - 1
+            else:
+                ray &= ~((1 << (blockers.bit_length() - 1)) - 1)
+        attacks |= ray
+    return attacks
+
+
+def get_bishop_attacks(square, occupied):
+    return _get_slider_attacks(BISHOP_RAY_MASKS[square], occupied)
+
+
+def get_rook_attacks(square, occupied):
+    return _get_slider_attacks(ROOK_RAY_MASKS[square], occupied)
+
+
+def get_queen_attacks(square, occupied):
+    return get_bishop_attacks(square, occupied) | get_rook_attacks(square, occupied)
+
+
+# squares a piece of the given type and player on the given square attacks
+def get_attacks(type, player, square, occupied):
+    if type == 'P':
+        return PAWN_ATTACKS[player][square]
+    elif type == 'N':
+        return KNIGHT_ATTACKS[square]
+    elif type == 'B':
+        return get_bishop_attacks(square, occupied)
+    elif type == 'R':
+        return get_rook_attacks(square, occupied)
+    elif type == 'Q':
+        return get_queen_attacks(square, occupied)
+    else:
+        return KING_ATTACKS[square]
+
+
+# for each piece type, the squares from which a piece of that type belonging to player would attack the square
+def get_attacker_squares_by_type(square, player, occupied):
+    bishop = get_bishop_attacks(square, occupied)
+    rook = get_rook_attacks(square, occupied)
+    return {
+        'P': PAWN_ATTACKS[3 - player][square],
+        'N': KNIGHT_ATTACKS[square],
+        'B': bishop,
+        'R': rook,
+        'Q': bishop | rook,
+        'K': KING_ATTACKS[square],
+    }
+
+
+# the same tables as uint64 arrays, for computing attacks from many squares at once. LINE_MASK_ARRAY[square] holds
+# the bishop rays followed by the rook rays
+KNIGHT_ATTACK_ARRAY = np.array(KNIGHT_ATTACKS, np.uint64)
+KING_ATTACK_ARRAY = np.array(KING_ATTACKS, np.uint64)
+PAWN_ATTACK_ARRAYS = [None, np.array(PAWN_ATTACKS[1], np.uint64), np.array(PAWN_ATTACKS[2], np.uint64)]
+LINE_MASK_ARRAY = np.array(
+    [[mask for mask, ascending in BISHOP_RAY_MASKS[square] + ROOK_RAY_MASKS[square]] for square in xrange(64)],
+    np.uint64
+)
+LINE_ASCENDING = np.array([ascending for mask, ascending in BISHOP_RAY_MASKS[0] + ROOK_RAY_MASKS[0]], np.bool_)
+
+
+# bishop and rook attacks from each square with the matching occupancy, as two arrays
+def get_line_attack_arrays(squares, occupied):
+    rays = LINE_MASK_ARRAY[squares]
+    blockers = rays & occupied[:, None]
+
+    # rays toward higher squares stop at their lowest blocker
+    lowest = blockers & (~blockers + np.uint64(1))
+    ascending = rays & ((lowest << np.uint64(1)) - np.uint64(1))
+
+    # rays toward lower squares stop at their highest blocker, found by smearing the blockers downward
+    smeared = blockers
+    for shift in (1, 2, 4, 8, 16, 32):
+        smeared |= smeared >> np.uint64(shift)
+    descending = rays & (~smeared | (smeared ^ (smeared >> np.uint64(1))))
+
+    attacks = np.where(LINE_ASCENDING[None, :], ascending, descending)
+    return np.bitwise_or.reduce(attacks[:, :4], axis=1), np.bitwise_or.reduce(attacks[:, 4:], axis=1)
+
+
+class Bitboards(object):
+
+    # per-side occupancy (indexed by player) and per-type masks of the pieces at whole squares
+    __slots__ = ('players', 'types')
+
+    def __init__(self):
+        self.players = [0, 0, 0]
+        self.types = {t: 0 for t in ('P', 'N', 'B', 'R', 'Q', 'K')}
+
+    def occupied(self):
+        return self.players[1] | self.players[2]
+
+    def add(self, piece, bit):
+        self.players[piece.player] |= bit
+        self.types[piece.type] |= bit
+
+    def remove(self, piece, bit):
+        self.players[piece.player] &= ~bit
+        self.types[piece.type] &= ~bit
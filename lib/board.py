@@ -1,5 +1,9 @@
 import uuid
 
+from lib.attacks import AttackMap
+from lib.bitboard import Bitboards, square_bit
+from lib.zobrist import get_piece_key, get_pieces_hash
+
 
 class Piece(object):
 
@@ -11,6 +15,9 @@ class Piece(object):
     KING = 'K'
     ALL_TYPES = [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING]
 
+    # every live game holds a full set of pieces, so skip the per-instance __dict__
+    __slots__ = ('type', 'player', 'row', 'col', 'captured', 'moved', 'id')
+
     def __init__(self, type, player, row, col, captured=False, moved=False, id=None):
         if type not in Piece.ALL_TYPES:
             raise ValueError('Invalid piece type: ' + type)
@@ -21,7 +28,8 @@ class Piece(object):
         self.col = col
         self.captured = captured
         self.moved = moved
-        self.id = id or '%s:%s:%s:%s' % (type, player, row, col)
+        # ids are interned so games share the same strings
+        self.id = id or intern('%s:%s:%s:%s' % (type, player, row, col))
 
     def at_position(self, row, col):
         return Piece(
@@ -67,18 +75,151 @@ class Board(object):
     def __init__(self, pieces):
         self.pieces = pieces
 
+        # indexes for fast lookups, kept in sync by move_piece, capture_piece, promote_piece and mark_moved
+        self._pieces_by_id = {}
+        self._order = {}
+        self._grid = [[[] for col in xrange(8)] for row in xrange(8)]
+        self._bitboards = None
+        self._attack_map = None
+        self._hash = None
+        for i, p in enumerate(pieces):
+            self._pieces_by_id[p.id] = p
+            self._order[p.id] = i
+            if not p.captured:
+                self._add_to_grid(p)
+
     def get_piece_by_id(self, id):
-        for p in self.pieces:
-            if p.id == id:
-                return p
-        return None
+        return self._pieces_by_id.get(id)
+
+    # position of the piece in self.pieces
+    def get_index(self, piece):
+        return self._order[piece.id]
 
     def get_piece_by_location(self, row, col):
-        for p in self.pieces:
-            if not p.captured and p.row == row and p.col == col:
+        if row < 0 or row >= 8 or col < 0 or col >= 8:
+            return None
+
+        # cells only hold pieces at integral positions, so the equality check filters fractional lookups
+        for p in self._grid[int(row)][int(col)]:
+            if p.row == row and p.col == col:
                 return p
         return None
 
+    # moves a piece to a (possibly fractional, for knights in flight) position
+    def move_piece(self, piece, row, col):
+        if piece.row == row and piece.col == col:
+            return
+
+        if self._attack_map is not None:
+            squares = 0 if piece.captured else square_bit(piece.row, piece.col) | square_bit(row, col)
+            self._attack_map.update(piece, squares)
+
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+        if not piece.captured:
+            self._remove_from_grid(piece)
+        piece.row, piece.col = row, col
+        if not piece.captured:
+            self._add_to_grid(piece)
+
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+    def capture_piece(self, piece):
+        if piece.captured:
+            return
+
+        if self._attack_map is not None:
+            self._attack_map.update(piece, square_bit(piece.row, piece.col))
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+        self._remove_from_grid(piece)
+        piece.captured = True
+
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+    def promote_piece(self, piece, type):
+        if self._attack_map is not None:
+            self._attack_map.update(piece, 0)
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+        if self._bitboards is None or piece.captured:
+            piece.type = type
+        else:
+            self._remove_from_grid(piece)
+            piece.type = type
+            self._add_to_grid(piece)
+
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+    # notes that a piece has made a move, which matters for castling
+    def mark_moved(self, piece):
+        if piece.moved:
+            return
+
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+        piece.moved = True
+        if self._hash is not None:
+            self._hash ^= get_piece_key(piece)
+
+    # bitboard view of the pieces at whole squares, built on first use and kept in sync from then on
+    def get_bitboards(self):
+        if self._bitboards is None:
+            self._bitboards = Bitboards()
+            for row in self._grid:
+                for cell in row:
+                    for p in cell:
+                        self._bitboards.add(p, square_bit(p.row, p.col))
+        return self._bitboards
+
+    # zobrist hash of the pieces (see lib/zobrist.py), computed on first use and kept in sync from then on
+    def get_hash(self):
+        if self._hash is None:
+            self._hash = get_pieces_hash(self.pieces)
+        return self._hash
+
+    # which pieces attack which squares, built on first use and kept in sync from then on
+    def get_attack_map(self):
+        if self._attack_map is None:
+            self._attack_map = AttackMap(self.pieces, self._order, self.get_bitboards())
+        return self._attack_map
+
+    # lets go of the attack map, which is built again on next use
+    def drop_caches(self):
+        self._attack_map = None
+
+    def _add_to_grid(self, piece):
+        if piece.row != int(piece.row) or piece.col != int(piece.col):
+            return
+
+        cell = self._grid[int(piece.row)][int(piece.col)]
+        cell.append(piece)
+        if len(cell) > 1:
+            # pieces can briefly share a square; lookups return the earliest one in the pieces list
+            cell.sort(key=lambda p: self._order[p.id])
+
+        if self._bitboards is not None:
+            self._bitboards.add(piece, square_bit(piece.row, piece.col))
+
+    def _remove_from_grid(self, piece):
+        if piece.row != int(piece.row) or piece.col != int(piece.col):
+            return
+
+        cell = self._grid[int(piece.row)][int(piece.col)]
+        cell.remove(piece)
+
+        if self._bitboards is not None:
+            bit = square_bit(piece.row, piece.col)
+            self._bitboards.remove(piece, bit)
+            for p in cell:
+                self._bitboards.add(p, bit)
+
     def get_location_to_piece_map(self):
         result = {}
         for p in self.pieces:
@@ -0,0 +1,303 @@
+import collections
+import fcntl
+import multiprocessing
+import os
+import random
+import traceback
+
+from lib import ai
+from lib.game import Game, Speed
+
+
+# decisions a single worker can have queued before new ones are skipped, which keeps the requests small enough that
+# sending them never blocks the tick loop
+MAX_PENDING_PER_WORKER = 16
+
+
+# runs in each worker process: rebuilds the game from its snapshot and answers with the bot's move, if any
+def _work(conn):
+    bots = {}
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+
+        request_id, difficulty, player, (speed, players, num_players, is_campaign), snapshot = request
+        try:
+            if difficulty not in bots:
+                bots[difficulty] = ai.get_bot(difficulty)
+
+            game = Game(Speed(speed), players, num_players=num_players, is_campaign=is_campaign)
+            game.restore(snapshot)
+            move = bots[difficulty].choose_move(game, player)
+            result = None if move is None else (move[0].id, move[1], move[2])
+            decision = bots[difficulty].last_decision
+        except:
+            traceback.print_exc()
+            result, decision = None, None
+
+        conn.send((request_id, result, decision))
+
+
+# clears O_NONBLOCK on a pipe end. once eventlet has monkey patched the socket module, the socket pairs multiprocessing
+# builds pipes from come out non-blocking, and the workers' reads fail straight away
+def _set_blocking(conn):
+    flags = fcntl.fcntl(conn.fileno(), fcntl.F_GETFL)
+    fcntl.fcntl(conn.fileno(), fcntl.F_SETFL, flags & ~os.O_NONBLOCK)
+
+
+class _Worker(object):
+
+    def __init__(self):
+        self.conn, worker_conn = multiprocessing.Pipe()
+        _set_blocking(self.conn)
+        _set_blocking(worker_conn)
+        self.process = multiprocessing.Process(target=_work, args=(worker_conn,))
+        self.process.daemon = True
+        self.process.start()
+        worker_conn.close()
+        self.pending = 0
+
+    def stop(self):
+        try:
+            self.conn.close()
+        except (IOError, OSError):
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class BotPool(object):
+
+    # decides bot moves in worker processes, so bots don't hold up the tick for every game. a decision is requested
+    # with a snapshot of the game and applied on a later tick, or skipped if it comes back more than
+    # max_latency_ticks after it was requested. with no workers, decisions are made right away in this process
+    def __init__(self, num_workers=None, max_latency_ticks=5):
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+
+        self.max_latency_ticks = max_latency_ticks
+        self.workers = [_Worker() for i in xrange(num_workers)]
+
+        self.next_request_id = 0
+        self.pending = {}  # (game id, player) -> (request id, worker, tick requested)
+        self.results = {}  # (game id, player) -> (tick requested, move)
+
+        # counts, for logging
+        self.num_requested = 0
+        self.num_applied = 0
+        self.num_skipped = 0
+        self.num_restarted = 0
+        self.num_cut_short = 0
+        self.num_over_budget = 0
+        self.max_decision_time = 0
+        self.num_decided = 0
+        self.num_cache_hits = 0
+
+    # whether a decision for the bot is still being made
+    def is_pending(self, game_id, game, player):
+        key = (game_id, player)
+        if key not in self.pending:
+            return False
+
+        request_id, worker, tick = self.pending[key]
+        if game.current_tick - tick <= self.max_latency_ticks:
+            return True
+
+        # it's too late for that one, whatever it decides
+        del self.pending[key]
+        return False
+
+    # asks for a decision, unless one is still being made
+    def request(self, game_id, game, player, bot):
+        key = (game_id, player)
+        if self.is_pending(game_id, game, player):
+            return
+
+        self.num_requested += 1
+        if not self.workers:
+            move = bot.choose_move(game, player)
+            self.results[key] = (game.current_tick, move and (move[0].id, move[1], move[2]))
+            self._record_decision(bot.last_decision)
+            return
+
+        worker = min(self.workers, key=lambda w: w.pending)
+        if worker.pending >= MAX_PENDING_PER_WORKER:
+            self.num_skipped += 1
+            return
+
+        game_info = (game.speed.value, game.players, game.num_players, game.is_campaign)
+        try:
+            worker.conn.send((self.next_request_id, bot.difficulty, player, game_info, game.snapshot()))
+        except (IOError, OSError):
+            traceback.print_exc()
+            self._replace_worker(worker)
+            self.num_skipped += 1
+            return
+
+        worker.pending += 1
+        self.pending[key] = (self.next_request_id, worker, game.current_tick)
+        self.next_request_id += 1
+
+    # collects the decisions the workers have finished, without waiting for the others, and replaces workers that
+    # have died
+    def poll(self):
+        keys_by_request_id = {request_id: key for key, (request_id, worker, tick) in self.pending.iteritems()}
+        for worker in list(self.workers):
+            try:
+                while worker.conn.poll():
+                    request_id, move, decision = worker.conn.recv()
+                    worker.pending -= 1
+                    self._record_decision(decision)
+
+                    key = keys_by_request_id.get(request_id)
+                    if key is None:
+                        # given up on already
+                        self.num_skipped += 1
+                        continue
+
+                    tick = self.pending.pop(key)[2]
+                    self.results[key] = (tick, move)
+            except (IOError, OSError, EOFError):
+                self._replace_worker(worker)
+                continue
+
+            if not worker.process.is_alive():
+                self._replace_worker(worker)
+
+    # starts a new worker in place of one that died or whose pipe broke. the decisions it had pending are dropped, so
+    # their bots ask again
+    def _replace_worker(self, worker):
+        print 'bot worker', worker.process.pid, 'died with exit code', worker.process.exitcode, '- starting another'
+        worker.stop()
+        for key in [key for key, (request_id, w, tick) in self.pending.iteritems() if w is worker]:
+            del self.pending[key]
+            self.num_skipped += 1
+
+        self.workers[self.workers.index(worker)] = _Worker()
+        self.num_restarted += 1
+
+    # the decided (piece id, row, col) move for the bot, if one came back in time
+    def get_move(self, game_id, game, player):
+        result = self.results.pop((game_id, player), None)
+        if result is None:
+            return None
+
+        tick, move = result
+        if game.current_tick - tick > self.max_latency_ticks:
+            self.num_skipped += 1
+            return None
+
+        if move is not None:
+            self.num_applied += 1
+        return move
+
+    # notes how a bot's time budget held up, and whether its decision cache had the position
+    def _record_decision(self, decision):
+        if decision is None:
+            return
+
+        decision_time, cut_short, over_budget, cached = decision
+        self.num_cut_short += cut_short
+        self.num_over_budget += over_budget
+        self.max_decision_time = max(self.max_decision_time, decision_time)
+        self.num_decided += 1
+        self.num_cache_hits += cached
+
+    # drops anything pending for a game that's going away
+    def remove_game(self, game_id):
+        for key in [key for key in self.pending if key[0] == game_id]:
+            del self.pending[key]
+        for key in [key for key in self.results if key[0] == game_id]:
+            del self.results[key]
+
+
+class BotScheduler(object):
+
+    # decides which bots make a decision each tick. every bot gets its own random draw, so bots in different games
+    # don't all decide on the same ticks, and the time budgets of the decisions let through add up to at most
+    # max_decision_time_per_tick microseconds. that bounds the bot time started each tick, which a count of decisions
+    # wouldn't, since one bot's decision can cost many times another's; a bot without a time budget takes the whole
+    # tick. bots over the limit are deferred, not dropped, and go ahead of the others on the following ticks. bots on
+    # a fixed schedule keep it, but each is given the phase the fewest others decide on, so their decisions don't line
+    # up across games either. the games have to be ticked once for each call to start_tick
+    def __init__(self, max_decision_time_per_tick=None):
+        self.max_decision_time_per_tick = max_decision_time_per_tick
+        self.deferred = {}  # (game id, player) -> time budget, of bots waiting for a later tick
+
+        self.tick_number = 0
+        self.phases = {}  # (game id, player) -> (phase, slot) of bots on a fixed schedule
+        self.slot_counts = collections.Counter()  # (ticks per move, tick number modulo it) -> bots deciding then
+
+        # counts, for logging
+        self.num_decisions = 0
+        self.num_deferred = 0
+
+        self.start_tick()
+
+    # pending holds the (game id, player) of bots with a decision still being made. they don't ask this tick, so
+    # nothing is kept back for them if they're deferred
+    def start_tick(self, pending=()):
+        self.tick_number += 1
+        self.decision_time_this_tick = 0
+        self.reserved_time = sum(budget for key, budget in self.deferred.iteritems() if key not in pending)
+
+    # whether the bot should decide on a move now
+    def should_decide(self, game_id, game, player, bot):
+        key = (game_id, player)
+        budget = self._get_budget(bot)
+        if key in self.deferred:
+            if self._is_full(budget, 0):
+                return False
+
+            del self.deferred[key]
+            self.reserved_time = max(0, self.reserved_time - budget)
+        else:
+            if not self._is_due(key, game, bot):
+                return False
+
+            if self._is_full(budget, self.reserved_time):
+                self.deferred[key] = budget
+                self.num_deferred += 1
+                return False
+
+        self.decision_time_this_tick += budget
+        self.num_decisions += 1
+        return True
+
+    # forgets the bots of a game that's going away
+    def remove_game(self, game_id):
+        for key in [key for key in self.deferred if key[0] == game_id]:
+            del self.deferred[key]
+        for key in [key for key in self.phases if key[0] == game_id]:
+            self.slot_counts[self.phases.pop(key)[1]] -= 1
+
+    def _is_due(self, key, game, bot):
+        if not bot.FIXED_SCHEDULE:
+            return bot._should_move(game, random.randint(0, 9999))
+
+        if key not in self.phases:
+            # the game ticks along with tick_number, so deciding when the game's tick plus the phase is a multiple of
+            # ticks_per_move means deciding when tick_number is the slot, modulo ticks_per_move
+            ticks_per_move = bot.ticks_per_move
+            slot = min(xrange(ticks_per_move), key=lambda s: self.slot_counts[(ticks_per_move, s)])
+            self.slot_counts[(ticks_per_move, slot)] += 1
+            phase = (self.tick_number - game.current_tick - slot) % ticks_per_move
+            self.phases[key] = (phase, (ticks_per_move, slot))
+
+        return bot._should_move(game, None, self.phases[key][0])
+
+    # microseconds the bot's decision counts for against the limit
+    def _get_budget(self, bot):
+        if bot.time_budget is None:
+            return self.max_decision_time_per_tick or 0
+        return bot.time_budget
+
+    # whether a decision with the given budget would go over the limit, with reserved microseconds kept back. one
+    # gets through on a tick nothing else has claimed, even if it's over the limit on its own
+    def _is_full(self, budget, reserved):
+        if self.max_decision_time_per_tick is None:
+            return False
+        if self.decision_time_this_tick == 0 and reserved == 0:
+            return False
+        return self.decision_time_this_tick + reserved + budget > self.max_decision_time_per_tick
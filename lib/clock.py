@@ -0,0 +1,66 @@
+import math
+import time
+
+
+# seconds between game ticks on the server
+TICK_PERIOD = 0.1
+
+
+class WallClock(object):
+
+    def time(self):
+        return time.time()
+
+    def tick(self, ticks=1):
+        pass
+
+    # number of ticks until time() reaches t, or None if that cannot be predicted
+    def ticks_until(self, t):
+        return 0 if time.time() >= t else None
+
+    # wall clocks have no state of their own, so copies and snapshots are trivial
+    def copy(self):
+        return self
+
+    def snapshot(self):
+        return None
+
+    def restore(self, snapshot):
+        pass
+
+
+class VirtualClock(object):
+    # clock that only moves when the game ticks, so simulations can run faster than real time. each game needs its own,
+    # since every call to Game.tick advances it
+    def __init__(self, tick_period=TICK_PERIOD, start_time=0):
+        self.tick_period = tick_period
+        self.start_time = start_time
+        self.ticks = 0
+
+    def time(self):
+        # computed from the tick count rather than accumulated to avoid float drift
+        return self.start_time + self.ticks * self.tick_period
+
+    def tick(self, ticks=1):
+        self.ticks += ticks
+
+    def ticks_until(self, t):
+        ticks = max(0, int(math.ceil((t - self.time()) / self.tick_period)))
+
+        # correct for rounding so this agrees exactly with time()
+        while ticks > 0 and self.start_time + (self.ticks + ticks - 1) * self.tick_period >= t:
+            ticks -= 1
+        while self.start_time + (self.ticks + ticks) * self.tick_period < t:
+            ticks += 1
+        return ticks
+
+    def copy(self):
+        clock = VirtualClock(self.tick_period, self.start_time)
+        clock.ticks = self.ticks
+        return clock
+
+    def snapshot(self):
+        return self.ticks
+
+    def restore(self, snapshot):
+        self.ticks = snapshot
@@ -0,0 +1,171 @@
+import heapq
+import itertools
+import math
+
+
+# a little over the largest distance at which pieces can capture each other (see Game.tick), so that rounding never
+# leaves out a pair that gets that close
+CAPTURE_DISTANCE = 0.71 + 1e-6
+
+INFINITY = float('inf')
+
+
+# the path of a piece on a move, as (from tick, to tick, row, col, row velocity, col velocity) segments over which it is
+# at (row + row velocity * (tick - from tick), ...). it starts from when the piece can be captured (knights only come
+# down at the end of their move) and ends with the piece resting at its destination, until it moves again. every step
+# of a move goes the same way, so consecutive steps merge into a single segment
+def get_move_path(move, move_ticks):
+    move_seq = move.move_seq
+    path = []
+    for i in xrange(len(move_seq) - 1):
+        (row, col), (next_row, next_col) = move_seq[i], move_seq[i + 1]
+        from_tick = move.starting_tick + i * move_ticks
+        velocity = (float(next_row - row) / move_ticks, float(next_col - col) / move_ticks)
+        if path and path[-1][4:] == velocity and path[-1][1] == from_tick:
+            path[-1] = path[-1][:1] + (from_tick + move_ticks,) + path[-1][2:]
+        else:
+            path.append((from_tick, from_tick + move_ticks, row, col) + velocity)
+
+    end_tick = move.starting_tick + move_ticks * (len(move_seq) - 1)
+    path.append((end_tick, INFINITY, move_seq[-1][0], move_seq[-1][1], 0.0, 0.0))
+
+    if move.piece.type == 'N':
+        landing_tick = end_tick - move_ticks / 2
+        landing_path = []
+        for segment in path:
+            if segment[1] < landing_tick:
+                continue
+
+            if segment[0] < landing_tick:
+                segment = (landing_tick, segment[1]) + _get_position(segment, landing_tick) + segment[4:]
+            landing_path.append(segment)
+        path = landing_path
+
+    return path
+
+
+# the path of a piece resting where it is
+def get_static_path(piece):
+    return [(-INFINITY, INFINITY, piece.row, piece.col, 0.0, 0.0)]
+
+
+# windows of ticks, as (from tick, to tick), between from_tick and to_tick at which the pieces on the two paths might
+# be within CAPTURE_DISTANCE of each other. the distance between two segments changes quadratically with time, so
+# each pair of segments gives at most one window, rounded out to whole ticks
+def get_capture_windows(path, other_path, from_tick, to_tick):
+    windows = []
+    for segment in path:
+        for other_segment in other_path:
+            start = max(segment[0], other_segment[0], from_tick)
+            end = min(segment[1], other_segment[1], to_tick)
+            if start > end:
+                continue
+
+            row, col = _get_position(segment, start)
+            other_row, other_col = _get_position(other_segment, start)
+            row_delta, col_delta = row - other_row, col - other_col
+            row_velocity, col_velocity = segment[4] - other_segment[4], segment[5] - other_segment[5]
+
+            # solve |delta + velocity * t|^2 <= CAPTURE_DISTANCE^2 for the ticks t after start
+            a = row_velocity * row_velocity + col_velocity * col_velocity
+            b = row_delta * row_velocity + col_delta * col_velocity
+            c = row_delta * row_delta + col_delta * col_delta - CAPTURE_DISTANCE * CAPTURE_DISTANCE
+            if a == 0:
+                if c > 0:
+                    continue
+                first, last = 0, end - start
+            else:
+                discriminant = b * b - a * c
+                if discriminant < 0:
+                    continue
+
+                root = math.sqrt(discriminant)
+                first, last = max(0, (-b - root) / a), min(end - start, (-b + root) / a)
+                if first > last:
+                    continue
+
+            windows.append((int(math.floor(start + first)), int(math.ceil(start + last))))
+
+    return windows
+
+
+def _get_position(segment, tick):
+    from_tick, to_tick, row, col, row_velocity, col_velocity = segment
+    if row_velocity == 0 and col_velocity == 0:
+        return row, col
+    return row + row_velocity * (tick - from_tick), col + col_velocity * (tick - from_tick)
+
+
+class CaptureSchedule(object):
+
+    # pairs of pieces of different players that might get close enough for a capture, worked out once when a move
+    # starts instead of by comparing positions on every tick. each pair gets windows of ticks, queued by the tick they
+    # open on, which hold only as long as neither piece starts another move. captured pieces are left for the caller
+    # to skip. the game has to be ticked in order, as windows are let go of once they close
+    def __init__(self, game):
+        self.game = game
+
+        self._paths = {}  # piece id -> (move that set its path, path), for pieces that moved since the schedule began
+        self._queue = []  # (from tick, to tick, order, piece id, move, other piece id, other move), soonest first
+        self._open = []
+        self._order = itertools.count()
+
+        # moves already under way: every path has to be known before any windows are worked out
+        for move in game.active_moves:
+            self._paths[move.piece.id] = (move, get_move_path(move, game.move_ticks))
+        scheduled = set()
+        for move in game.active_moves:
+            self._schedule(move, scheduled)
+            scheduled.add(move.piece.id)
+
+    # called by the game when a move is started
+    def add_move(self, move):
+        self._paths[move.piece.id] = (move, get_move_path(move, self.game.move_ticks))
+        self._schedule(move, ())
+
+    # pieces each piece might capture or be captured by on the tick, as piece id -> set of piece ids
+    def get_pairs(self, tick):
+        queue = self._queue
+        while queue and queue[0][0] <= tick:
+            self._open.append(heapq.heappop(queue))
+
+        pairs = {}
+        still_open = []
+        for window in self._open:
+            from_tick, to_tick, order, piece_id, move, other_id, other_move = window
+            if to_tick < tick or self._get_move(piece_id) is not move or self._get_move(other_id) is not other_move:
+                continue
+
+            still_open.append(window)
+            pairs.setdefault(piece_id, set()).add(other_id)
+            pairs.setdefault(other_id, set()).add(piece_id)
+
+        self._open = still_open
+        return pairs
+
+    def _get_move(self, piece_id):
+        path = self._paths.get(piece_id)
+        return None if path is None else path[0]
+
+    # queues the windows of the move's piece with every enemy piece, except those in skip_ids. windows only matter
+    # while one of the two pieces is moving
+    def _schedule(self, move, skip_ids):
+        game = self.game
+        piece = move.piece
+        path = self._paths[piece.id][1]
+        end_tick = move.starting_tick + game.move_ticks * (len(move.move_seq) - 1)
+        for p in game.board.pieces:
+            if p.player == piece.player or p.captured or p.id in skip_ids:
+                continue
+
+            other_move, other_path = self._paths.get(p.id, (None, None))
+            to_tick = end_tick
+            if other_move is None:
+                other_path = get_static_path(p)
+            else:
+                to_tick = max(to_tick, other_move.starting_tick + game.move_ticks * (len(other_move.move_seq) - 1))
+
+            for from_tick, window_to_tick in get_capture_windows(path, other_path, move.starting_tick, to_tick):
+                heapq.heappush(
+                    self._queue, (from_tick, window_to_tick, next(self._order), piece.id, move, p.id, other_move)
+                )
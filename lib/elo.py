@@ -16,3 +16,23 @@ def update_ratings(ra, rb, winner):
     nra = ra + k * (sa - ea)
     nrb = rb + k * (sb - eb)
     return int(round(nra)), int(round(nrb))
+
+
+# rating difference of a over b suggested by their results against each other, and the margin of error for 95%
+# confidence (None for either when there are no games or every game went the same way, which puts no bound on the
+# difference)
+def estimate_difference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return None, None
+
+    score = (wins + 0.5 * draws) / games
+    if score <= 0 or score >= 1:
+        return None, None
+
+    # standard error of the score, carried over to the rating scale by the slope of the expected score curve
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    error = math.sqrt(variance / games)
+    difference = -400 * math.log10(1 / score - 1)
+    slope = 400 / (math.log(10) * score * (1 - score))
+    return difference, 1.96 * error * slope
@@ -0,0 +1,38 @@
+# captures are worked out on integer positions, in units of 1 / get_position_scale(move_ticks) of a square. pieces
+# are always on whole or half squares (knights in the air are halfway between squares), and each tick of a move covers
+# 1 / move_ticks of a square, so a quarter of that leaves every position at a whole number of units on every half tick,
+# which is as finely as captures look ahead
+
+# distances in squares, as (numerator, denominator) so they convert exactly: pieces further apart than the first are
+# never considered for a capture, and a capture needs them closer than the second
+CONSIDER_CAPTURE_DISTANCE = (71, 100)
+CAPTURE_DISTANCE = (4001, 10000)
+
+# fraction of a knight's move after which it has landed and can capture
+KNIGHT_LANDING = (85, 100)
+
+
+def get_position_scale(move_ticks):
+    return 4 * move_ticks
+
+
+# a coordinate, which is always on a whole or half square, in units
+def to_fixed(coordinate, position_scale):
+    return int(coordinate * 2) * (position_scale / 2)
+
+
+# the largest squared distance in units that is at most the distance (or with exclusive, under it), so distances can
+# be compared squared without any rounding
+def get_max_distance_sq(distance, position_scale, exclusive=False):
+    numerator, denominator = distance
+    bound = numerator * numerator * position_scale * position_scale
+    denominator_sq = denominator * denominator
+    if exclusive:
+        return (bound - 1) / denominator_sq
+    return bound / denominator_sq
+
+
+# whether a knight that started its move ticks ago has landed
+def has_knight_landed(ticks, move_ticks):
+    numerator, denominator = KNIGHT_LANDING
+    return ticks * denominator >= numerator * 2 * move_ticks
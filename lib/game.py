@@ -1,9 +1,18 @@
+import collections
 import datetime
-import math
 import threading
-import time
 
-from lib.board import Board
+from lib.analysis import PositionAnalysis
+from lib.board import Board, Piece
+from lib.clock import WallClock
+from lib.collisions import CaptureSchedule
+from lib.fixedpoint import (
+    CAPTURE_DISTANCE, CONSIDER_CAPTURE_DISTANCE, get_max_distance_sq, get_position_scale, has_knight_landed, to_fixed
+)
+from lib.legal import LegalMoves
+from lib.moves import BISHOP_RAYS, KING_BISHOP_RAYS, KING_ROOK_RAYS, KNIGHT_TARGETS, RAYS, ROOK_RAYS
+from lib.reach import ReachMap
+from lib.zobrist import MOTION_MODULUS, get_cooldown_term, get_move_term, get_relative_motion_hash
 
 
 class Speed(object):
@@ -33,6 +42,8 @@ class Speed(object):
 
 class Move(object):
 
+    __slots__ = ('piece', 'move_seq', 'starting_tick')
+
     def __init__(self, piece, move_seq, starting_tick):
         self.piece = piece
         self.move_seq = move_seq
@@ -49,6 +60,8 @@ class Move(object):
 
 class Cooldown(object):
 
+    __slots__ = ('piece', 'starting_tick')
+
     def __init__(self, piece, starting_tick):
         self.piece = piece
         self.starting_tick = starting_tick
@@ -61,6 +74,24 @@ class Cooldown(object):
         }
 
 
+# immutable copy of everything in a game that changes while it is played (except the move log, of which only the
+# length is kept), see Game.snapshot
+GameSnapshot = collections.namedtuple('GameSnapshot', [
+    'pieces',            # (type, player, row, col, captured, moved, id) for each piece, in board order
+    'active_moves',      # (piece index, move_seq, starting_tick), in order
+    'cooldowns',         # (piece index, starting_tick), in order
+    'move_log_length',
+    'players_ready',
+    'current_tick',
+    'last_move_time',
+    'last_tick_time',
+    'started',
+    'finished',
+    'last_capture_tick',
+    'clock',
+])
+
+
 class Game(object):
 
     GAME_CONTINUES = 0
@@ -85,29 +116,61 @@ class Game(object):
 
     # move_ticks     = number of ticks to move 1 square in any direction (including diagonal)
     # cooldown_ticks = number of ticks before a piece can move again
-    def __init__(self, speed, players, num_players=2, board=None, is_campaign=False, debug=False):
+    # clock      = source of time for the no-move draw rules (wall clock unless simulating, see lib/clock.py)
+    def __init__(self, speed, players, num_players=2, board=None, is_campaign=False, debug=False, clock=None):
         self.speed = speed
         self.players = players
         self.num_players = num_players
         self.board = board or Board.initial()
         self.is_campaign = is_campaign
         self.debug = debug
+        self.clock = clock or WallClock()
 
         self.move_ticks = speed.get_move_ticks()
         self.cooldown_ticks = speed.get_cooldown_ticks()
+
+        # captures are worked out on integer positions (see lib/fixedpoint.py), with distances compared squared
+        self.position_scale = get_position_scale(self.move_ticks)
+        self._max_consider_distance_sq = get_max_distance_sq(CONSIDER_CAPTURE_DISTANCE, self.position_scale)
+        self._max_capture_distance_sq = get_max_distance_sq(CAPTURE_DISTANCE, self.position_scale, exclusive=True)
         self.players_ready = {i + 1: False for i in xrange(num_players)}
 
         self.active_moves = []
         self.cooldowns = []
+        self.active_moves_by_piece_id = {}
+        self.cooldowns_by_piece_id = {}
         self.move_log = []
         self.current_tick = 0
-        self.last_move_time = time.time()
-        self.last_tick_time = time.time()
+        self.last_move_time = self.clock.time()
+        self.last_tick_time = self.last_move_time
         self.started = False
         self.finished = 0
         self.start_time = datetime.datetime.utcnow()
         self.last_capture_tick = 0
 
+        # piece id -> term of its active move or cooldown in the motion part of position_hash, and their sum, once
+        # position_hash has been asked for
+        self._motion_terms = None
+        self._motion_hash = 0
+
+        # when each piece could capture on each square, built on first use (see get_reach_map)
+        self._reach_map = None
+
+        # pairs of pieces that might capture one another and when, built on the first tick with pieces on the move and
+        # let go of once none are (see get_capture_schedule)
+        self._capture_schedule = None
+
+        # what the bots have worked out about the current position, brought up to date on moves and dropped on every
+        # tick (see get_analysis)
+        self._analysis = None
+
+        # legal destinations of idle pieces, built on first use and kept in sync from then on (see legal_moves)
+        self._legal_moves = None
+
+        # player -> squares of their active moves, worked out on first use and dropped on every move and tick (see
+        # _get_same_player_move_squares)
+        self._move_squares = {}
+
         self.piece_to_move_seq_fn = {
             'P': self._get_pawn_move_seq,
             'N': self._get_knight_move_seq,
@@ -151,20 +214,26 @@ class Game(object):
             return None
 
         # check if piece can move to destination
-        move_seq_res = self._compute_move_seq(piece, to_row, to_col)
-        if not move_seq_res:
+        if (to_row, to_col) not in self.legal_moves(piece_id):
             if self.debug:
                 print 'move failed: piece cannot move to destination or is blocked'
             return None
 
-        move_seq, extra_move = move_seq_res
+        move_seq, extra_move = self._compute_move_seq(piece, to_row, to_col)
         move_seq.insert(0, (piece.row, piece.col))
 
         # move is valid, add to active moves and game log
+        if self._analysis is not None:
+            self._analysis.start_move(player)
+        self._move_squares.pop(player, None)
         move = Move(piece, move_seq, self.current_tick + 1)
         self.active_moves.append(move)
+        self.active_moves_by_piece_id[piece.id] = move
         self.move_log.append(move)
-        piece.moved = True
+        self.board.mark_moved(piece)
+        self._hash_motion(piece, get_move_term, move)
+        if self._capture_schedule is not None:
+            self._capture_schedule.add_move(move)
 
         # check extra move (for castling)
         if extra_move:
@@ -172,22 +241,83 @@ class Game(object):
                 print 'castling %s' % piece
 
             self.active_moves.append(extra_move)
+            self.active_moves_by_piece_id[extra_move.piece.id] = extra_move
             self.move_log.append(extra_move)
-            extra_move.piece.moved = True
+            self.board.mark_moved(extra_move.piece)
+            self._hash_motion(extra_move.piece, get_move_term, extra_move)
+            if self._capture_schedule is not None:
+                self._capture_schedule.add_move(extra_move)
 
         if self.debug:
             print 'moving %s along %s from tick %s' % (piece, move_seq, self.current_tick)
 
         if not self.players[player].startswith('b') and not self.players[player].startswith('c'):
             # last move time only counts for non-bots
-            self.last_move_time = time.time()
+            self.last_move_time = self.clock.time()
 
         return move
 
+    # squares the piece can move to right now, as (row, col) pairs in a fixed order, or none if it is captured,
+    # moving or on cooldown. they are kept between calls and only worked out again once something they depend on
+    # changes (see lib/legal.py), so callers mustn't modify them
+    def legal_moves(self, piece_id):
+        piece = self.board.get_piece_by_id(piece_id)
+        if piece is None or piece.captured or self._already_moving(piece) or self._on_cooldown(piece):
+            return ()
+
+        if self._legal_moves is None:
+            self._legal_moves = LegalMoves(self)
+        return self._legal_moves.get(piece)
+
     # get the sequence of moves to move piece to (to_row, to_col)
     def _compute_move_seq(self, piece, to_row, to_col):
         return self.piece_to_move_seq_fn[piece.type](piece, to_row, to_col)
 
+    # squares the piece could move to if it were idle, in the order of its rays (bishop directions first)
+    def _compute_legal_moves(self, piece):
+        destinations = []
+        if piece.type == 'P':
+            row = piece.row + Game.PLAYER_DIRECTION[piece.player]
+            for col in [piece.col - 1, piece.col, piece.col + 1]:
+                if (
+                    row >= 0 and row < 8 and col >= 0 and col < 8 and
+                    self._get_pawn_move_seq(piece, row, col) is not None
+                ):
+                    destinations.append((row, col))
+
+            if (piece.player == 1 and piece.row == 6) or (piece.player == 2 and piece.row == 1):
+                row = piece.row + 2 * Game.PLAYER_DIRECTION[piece.player]
+                if self._get_pawn_move_seq(piece, row, piece.col) is not None:
+                    destinations.append((row, piece.col))
+
+        if piece.type == 'N':
+            for row, col in KNIGHT_TARGETS[piece.row][piece.col]:
+                if self._get_knight_move_seq(piece, row, col) is not None:
+                    destinations.append((row, col))
+
+        if piece.type in ['B', 'Q', 'K']:
+            for ray in (KING_BISHOP_RAYS if piece.type == 'K' else BISHOP_RAYS)[piece.row][piece.col]:
+                destinations.extend(self._get_ray_destinations(piece, ray))
+
+        if piece.type in ['R', 'Q', 'K']:
+            for ray in (KING_ROOK_RAYS if piece.type == 'K' else ROOK_RAYS)[piece.row][piece.col]:
+                destinations.extend(self._get_ray_destinations(piece, ray))
+
+        # castling, when neither the king nor the rook has moved and both have a clear way
+        if piece.type == 'K' and not piece.moved:
+            for col in [2, 6]:
+                rook_col = 0 if col == 2 else 7
+                rook_to_col = 3 if col == 2 else 5
+                rook_piece = self.board.get_piece_by_location(piece.row, rook_col)
+                if (
+                    rook_piece and not rook_piece.moved and
+                    self._get_rook_move_seq(piece, piece.row, col) is not None and
+                    self._get_rook_move_seq(rook_piece, rook_piece.row, rook_to_col) is not None
+                ):
+                    destinations.append((piece.row, col))
+
+        return destinations
+
     # pawns take one or two movements to get to their destination
     def _get_pawn_move_seq(self, piece, to_row, to_col):
 
@@ -289,13 +419,12 @@ class Game(object):
 
     # move in given direction without crossing pieces
     def _get_move_seq_ensuring_no_cross(self, piece, row_dir, col_dir, steps, capture=True):
-        moves = []
-        for i in xrange(1, steps + 1):
-            i_row, i_col = piece.row + row_dir * i, piece.col + col_dir * i
-            moves.append((i_row, i_col))
+        destinations, future_squares = self._get_same_player_move_squares(piece.player)
 
+        path = RAYS[piece.row][piece.col][(row_dir, col_dir)][:steps]
+        for i, square in enumerate(path, 1):
             # check for not moving pieces
-            i_piece = self.board.get_piece_by_location(i_row, i_col)
+            i_piece = self.board.get_piece_by_location(square[0], square[1])
             if (
                 i_piece is not None and
                 not i_piece.captured and
@@ -309,43 +438,109 @@ class Game(object):
                 return None
 
             # check for same player's moving pieces
-            for move in self.active_moves:
-                if move.piece.player == piece.player and move.move_seq[-1] == (i_row, i_col):
-                    return None
+            if square in destinations:
+                return None
 
         # the destination cannot be on the future path of any of the same player's moves
+        if path[-1] in future_squares:
+            return None
+
+        return list(path), None
+
+    # valid destinations along a ray (from RAYS), stopping at the first invalid one; the same as checking each square
+    # in turn with _get_move_seq_ensuring_no_cross, but walking the ray once
+    def _get_ray_destinations(self, piece, ray):
+        destinations, future_squares = self._get_same_player_move_squares(piece.player)
+
+        result = []
+        for square in ray:
+            if square in destinations:
+                break
+
+            i_piece = self.board.get_piece_by_location(square[0], square[1])
+            static = i_piece is not None and not self._already_moving(i_piece)
+            if static and i_piece.player == piece.player:
+                break
+
+            # squares still ahead of the same player's moves can be passed through, but not moved to
+            if square not in future_squares:
+                result.append(square)
+
+            # can capture a static piece but not move past it
+            if static:
+                break
+
+        return result
+
+    # destinations of the player's active moves, and the squares still ahead on their paths; these are shared, so
+    # callers mustn't modify them
+    def _get_same_player_move_squares(self, player):
+        result = self._move_squares.get(player)
+        if result is not None:
+            return result
+
+        destinations = set()
+        future_squares = set()
         for move in self.active_moves:
-            if move.piece.player != piece.player:
+            if move.piece.player != player:
                 continue
 
+            destinations.add(move.move_seq[-1])
             tick_delta = self.current_tick - move.starting_tick
             movements = (tick_delta + self.move_ticks - 1) / self.move_ticks
-            for row, col in move.move_seq[movements:]:
-                if i_row == row and i_col == col:
-                    return None
+            future_squares.update(move.move_seq[movements:])
 
-        return moves, None
+        result = self._move_squares[player] = (destinations, future_squares)
+        return result
 
     # whether piece is part of an active move
     def _already_moving(self, piece):
-        for move in self.active_moves:
-            if move.piece.id == piece.id:
-                return True
-        return False
+        return piece.id in self.active_moves_by_piece_id
 
     # whether a piece is on cooldown
     def _on_cooldown(self, piece):
-        for cooldown in self.cooldowns:
-            if cooldown.piece.id == piece.id:
-                return True
-        return False
+        return piece.id in self.cooldowns_by_piece_id
+
+    # number of ticks until the piece can move again (0 if it is idle)
+    def get_ticks_until_free(self, piece):
+        move = self.active_moves_by_piece_id.get(piece.id)
+        if move is not None:
+            end_tick = move.starting_tick + self.move_ticks * (len(move.move_seq) - 1)
+            return end_tick + self.cooldown_ticks - self.current_tick
+
+        cooldown = self.cooldowns_by_piece_id.get(piece.id)
+        if cooldown is not None:
+            return self.cooldown_ticks - (self.current_tick - cooldown.starting_tick)
+
+        return 0
+
+    # when each piece could next capture on each square, built on first use and brought up to date on every read
+    def get_reach_map(self):
+        if self._reach_map is None:
+            self._reach_map = ReachMap(self)
+        return self._reach_map
+
+    # analysis of the current position shared by the bots deciding in it, see lib/analysis.py
+    def get_analysis(self):
+        if self._analysis is None:
+            self._analysis = PositionAnalysis(self)
+        return self._analysis
+
+    # pairs of pieces that might capture one another on which ticks, see lib/collisions.py
+    def get_capture_schedule(self):
+        if self._capture_schedule is None:
+            self._capture_schedule = CaptureSchedule(self)
+        return self._capture_schedule
 
     # one tick of the game passing, returns a pair of:
     #   - status indicating whether the game continues or if someone won
     #   - list of meaningful updates (capture, move/cooldown finished, promotion)
     def tick(self):
+        self._analysis = None
+        self._move_squares = {}
         self.current_tick += 1
-        self.last_tick_time = time.time()
+        self.clock.tick()
+        self.last_tick_time = self.clock.time()
 
         updates = []
 
@@ -364,17 +559,19 @@ class Game(object):
             if self.debug and (piece.row != new_row or piece.col != new_col):
                 print '%s to %s %s' % (piece, new_row, new_col)
 
-            piece.row, piece.col = new_row, new_col
+            self.board.move_piece(piece, new_row, new_col)
 
             # promote pawn to queen
             if piece.type == 'P' and ((piece.player == 1 and piece.row == 0) or (piece.player == 2 and piece.row == 7)):
-                piece.type = 'Q'
+                self.board.promote_piece(piece, 'Q')
                 updates.append({
                     'type': 'promotion',
                     'piece': piece.to_json_obj(),
                 })
 
-        # resolve all captures
+        # resolve all captures, only looking at the pairs of pieces that might be close enough by now
+        pairs = self.get_capture_schedule().get_pairs(self.current_tick)
+        positions = {}
         for move in self.active_moves:
             if move.piece.captured:
                 continue
@@ -385,37 +582,46 @@ class Game(object):
                 continue
 
             piece = move.piece
-            row, col = self._get_interp_position(move, self.current_tick)
+            if piece.id not in pairs:
+                continue
+
+            # knights in the air cannot capture anything
+            position = self._get_capture_position(piece, moving, positions)
+            if position is None:
+                continue
 
-            # check each other piece
-            for p in self.board.pieces:
+            row, col = position
+
+            # check each nearby piece (in board order, so ties resolve the same way)
+            candidates = sorted(
+                (self.board.get_piece_by_id(piece_id) for piece_id in pairs[piece.id]), key=self.board.get_index
+            )
+            for p in candidates:
                 if p.player == piece.player or p.captured:
                     continue
 
+                # nor can they be captured
+                other_position = self._get_capture_position(p, moving, positions)
+                if other_position is None:
+                    continue
+
                 other_move = moving.get(p.id)
-                if other_move is not None:
-                    other_row, other_col = self._get_interp_position(other_move, self.current_tick)
-                    if other_row < 0 or other_col < 0:
-                        continue
-                else:
-                    other_row, other_col = p.row, p.col
+                other_row, other_col = other_position
 
                 # threshold for considering capture (half square diagonal is max distance)
-                dist = math.hypot(row - other_row, col - other_col)
-                if dist > 0.71:
+                dist_sq = (row - other_row) ** 2 + (col - other_col) ** 2
+                if dist_sq > self._max_consider_distance_sq:
                     continue
 
                 # knights can only capture at the end of their move
-                if piece.type == 'N':
-                    interp = float(self.current_tick - move.starting_tick) / (2 * self.move_ticks)
-                    if interp < 0.85:
-                        continue
+                if piece.type == 'N' and not has_knight_landed(self.current_tick - move.starting_tick, self.move_ticks):
+                    continue
 
                 # if the other piece is static and we're close enough, capture it
                 if other_move is None:
-                    if dist < 0.4001:
+                    if dist_sq <= self._max_capture_distance_sq:
                         if piece.type == 'P' and move.move_seq[0][1] == move.move_seq[-1][1]:
-                            piece.captured = True
+                            self.board.capture_piece(piece)
                             self.last_capture_tick = self.current_tick
                             updates.append({
                                 'type': 'capture',
@@ -423,7 +629,7 @@ class Game(object):
                                 'target': piece.to_json_obj(),
                             })
                         else:
-                            p.captured = True
+                            self.board.capture_piece(p)
                             self.last_capture_tick = self.current_tick
                             updates.append({
                                 'type': 'capture',
@@ -436,15 +642,15 @@ class Game(object):
                     continue
 
                 # check distance after a half-tick
-                n_row, n_col = self._get_interp_position(move, self.current_tick + 0.5)
-                n_dist = math.hypot(n_row - other_row, n_col - other_col)
+                n_row, n_col = self._get_fixed_position(move, 2 * self.current_tick + 1)
+                n_dist_sq = (n_row - other_row) ** 2 + (n_col - other_col) ** 2
 
                 # check other distince after a half-tick
-                n_other_row, n_other_col = self._get_interp_position(other_move, self.current_tick + 0.5)
-                n_other_dist = math.hypot(row - n_other_row, col - n_other_col)
+                n_other_row, n_other_col = self._get_fixed_position(other_move, 2 * self.current_tick + 1)
+                n_other_dist_sq = (row - n_other_row) ** 2 + (col - n_other_col) ** 2
 
                 # one of these has to be within the true capture threshold to consider a capture
-                if min(dist, n_dist, n_other_dist) > 0.4001:
+                if min(dist_sq, n_dist_sq, n_other_dist_sq) > self._max_capture_distance_sq:
                     continue
 
                 # pawns not moving diagonally cannot capture, so they always get captured on collision
@@ -454,7 +660,7 @@ class Game(object):
                         other_move.move_seq[0][1] != other_move.move_seq[-1][1] or
                         other_move.starting_tick < move.starting_tick
                     ):
-                        piece.captured = True
+                        self.board.capture_piece(piece)
                         self.last_capture_tick = self.current_tick
                         updates.append({
                             'type': 'capture',
@@ -467,10 +673,10 @@ class Game(object):
                     continue
 
                 captured = False
-                if n_dist < dist and n_other_dist > dist:
+                if n_dist_sq < dist_sq and n_other_dist_sq > dist_sq:
                     # piece is moving closer, other piece is moving away
                     captured = True
-                elif n_dist > dist and n_other_dist < dist:
+                elif n_dist_sq > dist_sq and n_other_dist_sq < dist_sq:
                     # other_piece captures, let that piece trigger it
                     pass
                 else:
@@ -480,7 +686,7 @@ class Game(object):
 
                 if captured:
                     self.last_capture_tick = self.current_tick
-                    other_move.piece.captured = True
+                    self.board.capture_piece(other_move.piece)
                     updates.append({
                         'type': 'capture',
                         'piece': piece.to_json_obj(),
@@ -494,6 +700,7 @@ class Game(object):
         new_cooldowns = []
         for move in self.active_moves:
             if move.piece.captured:
+                self._unhash_motion(move.piece)
                 continue
 
             tick_delta = self.current_tick - move.starting_tick
@@ -501,7 +708,10 @@ class Game(object):
                 if self.debug:
                     print '%s going on cooldown' % move.piece
 
-                new_cooldowns.append(Cooldown(move.piece, self.current_tick))
+                cooldown = Cooldown(move.piece, self.current_tick)
+                new_cooldowns.append(cooldown)
+                self._unhash_motion(move.piece)
+                self._hash_motion(move.piece, get_cooldown_term, cooldown)
                 updates.append({
                     'type': 'startcooldown',
                     'piece': move.piece.to_json_obj(),
@@ -512,12 +722,14 @@ class Game(object):
         # remove cooldowns that have ended
         for cooldown in self.cooldowns:
             if cooldown.piece.captured:
+                self._unhash_motion(cooldown.piece)
                 continue
 
             tick_delta = self.current_tick - cooldown.starting_tick
             if tick_delta < self.cooldown_ticks:
                 new_cooldowns.append(cooldown)
             else:
+                self._unhash_motion(cooldown.piece)
                 if self.debug:
                     print '%s going off cooldown' % cooldown.piece
 
@@ -529,11 +741,19 @@ class Game(object):
         # set new active moves and cooldowns
         self.active_moves = new_active_moves
         self.cooldowns = new_cooldowns
+        self.active_moves_by_piece_id = {move.piece.id: move for move in new_active_moves}
+        self.cooldowns_by_piece_id = {cooldown.piece.id: cooldown for cooldown in new_cooldowns}
+
+        # captures need a piece on the move, so without any the schedule has nothing left to offer; the next tick with
+        # a move builds a new one
+        if not new_active_moves:
+            self._capture_schedule = None
 
         for p in self.board.pieces:
             # someone's king has been captured, so the game is over
             if p.type == 'K' and p.captured:
                 self.finished = 1 if p.player == 2 else 2
+                self._drop_caches()
                 return self.finished, updates
 
         # too long without a capture or player move, consider it a draw
@@ -542,44 +762,224 @@ class Game(object):
                 not self.is_campaign and
                 self.current_tick >= Game.MIN_DRAW_TICKS[self.speed.value] and
                 self.current_tick - self.last_capture_tick > Game.DRAW_LIMITS[self.speed.value] and
-                time.time() - self.last_move_time >= Game.NO_MOVE_TIMEOUTS[self.speed.value]
+                self.last_tick_time - self.last_move_time >= Game.NO_MOVE_TIMEOUTS[self.speed.value]
             ) or
             (
                 self.is_campaign and
-                time.time() - self.last_move_time >= Game.CAMPAIGN_NO_MOVE_TIMEOUT
+                self.last_tick_time - self.last_move_time >= Game.CAMPAIGN_NO_MOVE_TIMEOUT
             )
         ):
             self.finished = -1
+            self._drop_caches()
             return -1, updates
 
         return 0, updates
 
-    def _get_interp_position(self, move, current_tick):
-        total_move_ticks = self.move_ticks * (len(move.move_seq) - 1)
-        tick_delta = current_tick - move.starting_tick
-        if move.piece.type == 'N' and tick_delta < total_move_ticks - self.move_ticks / 2:
-            return -1, -1
+    # lets go of what's only kept to speed up moves, ticks and the bots, once the game is over and held on to just for
+    # its state. any of it is built again if asked for
+    def _drop_caches(self):
+        self.board.drop_caches()
+        self._motion_terms = None
+        self._motion_hash = 0
+        self._reach_map = None
+        self._capture_schedule = None
+        self._analysis = None
+        self._legal_moves = None
+        self._move_squares = {}
+
+    # earliest tick at which tick() can produce updates or end the game, or None if nothing is pending
+    def next_event_tick(self):
+        # moving pieces can step or collide on any tick
+        if self.active_moves:
+            return self.current_tick + 1
+
+        event_ticks = [cooldown.starting_tick + self.cooldown_ticks for cooldown in self.cooldowns]
+
+        # draws are the only other thing that can happen on an otherwise quiet board
+        if self.is_campaign:
+            timeout_ticks = self.clock.ticks_until(self.last_move_time + Game.CAMPAIGN_NO_MOVE_TIMEOUT)
+            if timeout_ticks is not None:
+                event_ticks.append(self.current_tick + timeout_ticks)
+        else:
+            draw_tick = max(
+                Game.MIN_DRAW_TICKS[self.speed.value],
+                self.last_capture_tick + Game.DRAW_LIMITS[self.speed.value] + 1,
+            )
 
-        movements = int(tick_delta) / self.move_ticks
-        if movements >= len(move.move_seq):
-            movements = len(move.move_seq) - 1
+            # if the clock cannot tell when the no-move timeout passes, assume it might have by then
+            timeout_ticks = self.clock.ticks_until(self.last_move_time + Game.NO_MOVE_TIMEOUTS[self.speed.value])
+            if timeout_ticks is not None:
+                draw_tick = max(draw_tick, self.current_tick + timeout_ticks)
+            event_ticks.append(draw_tick)
 
-        row1, col1 = move.move_seq[movements][0], move.move_seq[movements][1]
-        if movements >= len(move.move_seq) - 1:
-            row2, col2 = row1, col1
+        if not event_ticks:
+            return None
+        return max(self.current_tick + 1, min(event_ticks))
+
+    # advances the game to target_tick, jumping over ticks where nothing can happen; returns the same as tick()
+    # with the updates of every tick concatenated, stopping early if the game ends
+    def advance_to(self, target_tick):
+        status, updates = Game.GAME_CONTINUES, []
+        while self.current_tick < target_tick:
+            next_tick = self.next_event_tick()
+            if next_tick is None or next_tick > target_tick:
+                next_tick = target_tick
+
+            # quiet ticks only advance the counter, so skip straight to the tick before the event
+            if next_tick - 1 > self.current_tick:
+                self.clock.tick(next_tick - 1 - self.current_tick)
+                self.current_tick = next_tick - 1
+                self.last_tick_time = self.clock.time()
+
+            status, tick_updates = self.tick()
+            updates.extend(tick_updates)
+            if status != Game.GAME_CONTINUES:
+                break
+
+        return status, updates
+
+    # where the piece is this tick for capturing, in fixed-point units (see position_scale), or None for knights in
+    # the air; positions are kept in the dict
+    def _get_capture_position(self, piece, moving, positions):
+        if piece.id in positions:
+            return positions[piece.id]
+
+        move = moving.get(piece.id)
+        if move is None:
+            position = to_fixed(piece.row, self.position_scale), to_fixed(piece.col, self.position_scale)
         else:
-            row2, col2 = move.move_seq[movements + 1][0], move.move_seq[movements + 1][1]
+            position = self._get_fixed_position(move, 2 * self.current_tick)
+        positions[piece.id] = position
+        return position
+
+    # position of the moving piece at the given half tick (twice the tick, plus one for halfway through it) in
+    # fixed-point units, or None while a knight is in the air
+    def _get_fixed_position(self, move, half_tick):
+        movement_half_ticks = 2 * self.move_ticks
+        total_half_ticks = movement_half_ticks * (len(move.move_seq) - 1)
+        half_ticks = half_tick - 2 * move.starting_tick
+        if move.piece.type == 'N' and half_ticks < total_half_ticks - 2 * (self.move_ticks / 2):
+            return None
 
-        weight1 = 1 - float(tick_delta % self.move_ticks) / self.move_ticks
-        row, col = row1 * weight1 + row2 * (1 - weight1), col1 * weight1 + col2 * (1 - weight1)
-        return row, col
+        movements = half_ticks / movement_half_ticks
+        if movements >= len(move.move_seq) - 1:
+            row, col = move.move_seq[-1]
+            return to_fixed(row, self.position_scale), to_fixed(col, self.position_scale)
+
+        (row1, col1), (row2, col2) = move.move_seq[movements], move.move_seq[movements + 1]
+
+        # squares are position_scale units across, which take movement_half_ticks to cover, so a move covers 2 units
+        # per half tick for every square it goes
+        progress = half_ticks % movement_half_ticks
+        return (
+            to_fixed(row1, self.position_scale) + int((row2 - row1) * 2) * progress,
+            to_fixed(col1, self.position_scale) + int((col2 - col1) * 2) * progress,
+        )
+
+    # zobrist hash of the position (see lib/zobrist.py): every piece, including captured ones since the bots still see
+    # them, and the active moves and cooldowns relative to the current tick, so that the same position hashes the same
+    # at any tick. the speed isn't part of it, so only compare hashes of games at the same speed. it's kept up to date
+    # as the game goes once it has been asked for
+    @property
+    def position_hash(self):
+        if self._motion_terms is None:
+            self._motion_terms = {}
+            self._motion_hash = 0
+            for move in self.active_moves:
+                self._hash_motion(move.piece, get_move_term, move)
+            for cooldown in self.cooldowns:
+                self._hash_motion(cooldown.piece, get_cooldown_term, cooldown)
+
+        return self.board.get_hash() ^ get_relative_motion_hash(self._motion_hash, self.current_tick)
+
+    def _hash_motion(self, piece, get_term, motion):
+        if self._motion_terms is not None:
+            term = get_term(motion)
+            self._motion_terms[piece.id] = term
+            self._motion_hash = (self._motion_hash + term) % MOTION_MODULUS
+
+    def _unhash_motion(self, piece):
+        if self._motion_terms is not None:
+            self._motion_hash = (self._motion_hash - self._motion_terms.pop(piece.id)) % MOTION_MODULUS
+
+    # captures the current state of the game in a GameSnapshot; move sequences are shared rather than copied since
+    # they are never modified once a move has started
+    def snapshot(self):
+        piece_index = {p.id: i for i, p in enumerate(self.board.pieces)}
+        return GameSnapshot(
+            pieces=tuple((p.type, p.player, p.row, p.col, p.captured, p.moved, p.id) for p in self.board.pieces),
+            active_moves=tuple(
+                (piece_index[move.piece.id], move.move_seq, move.starting_tick) for move in self.active_moves
+            ),
+            cooldowns=tuple((piece_index[cooldown.piece.id], cooldown.starting_tick) for cooldown in self.cooldowns),
+            move_log_length=len(self.move_log),
+            players_ready=tuple(self.players_ready.iteritems()),
+            current_tick=self.current_tick,
+            last_move_time=self.last_move_time,
+            last_tick_time=self.last_tick_time,
+            started=self.started,
+            finished=self.finished,
+            last_capture_tick=self.last_capture_tick,
+            clock=self.clock.snapshot(),
+        )
+
+    # returns the game to a snapshot taken from it (or from one of its clones); moves logged since the snapshot are
+    # dropped from the move log
+    def restore(self, snapshot):
+        self.board = Board([Piece(*p) for p in snapshot.pieces])
+        pieces = self.board.pieces
+        self.active_moves = [
+            Move(pieces[i], move_seq, starting_tick) for i, move_seq, starting_tick in snapshot.active_moves
+        ]
+        self.cooldowns = [Cooldown(pieces[i], starting_tick) for i, starting_tick in snapshot.cooldowns]
+        self.active_moves_by_piece_id = {move.piece.id: move for move in self.active_moves}
+        self.cooldowns_by_piece_id = {cooldown.piece.id: cooldown for cooldown in self.cooldowns}
+        del self.move_log[snapshot.move_log_length:]
+
+        self.players_ready = dict(snapshot.players_ready)
+        self.current_tick = snapshot.current_tick
+        self.last_move_time = snapshot.last_move_time
+        self.last_tick_time = snapshot.last_tick_time
+        self.started = snapshot.started
+        self.finished = snapshot.finished
+        self.last_capture_tick = snapshot.last_capture_tick
+        self.clock.restore(snapshot.clock)
+
+        # the new board starts without a hash too, so position_hash gets computed afresh when next asked for
+        self._motion_terms = None
+        self._motion_hash = 0
+        self._capture_schedule = None
+        self._analysis = None
+        self._move_squares = {}
+        if self._legal_moves is not None:
+            self._legal_moves.restore()
+
+    # independent copy of the game that can be played forward without affecting this one; the move log is copied
+    # shallowly, so its entries still refer to this game's pieces. the copy gets a copy of this game's clock unless
+    # another one is given (like a VirtualClock starting at the current time, to play it forward faster than real time)
+    def clone(self, clock=None):
+        if clock is None:
+            clock = self.clock.copy()
+
+        game = Game(
+            self.speed, dict(self.players), num_players=self.num_players, board=self.board,
+            is_campaign=self.is_campaign, debug=self.debug, clock=clock,
+        )
+        game.move_log = list(self.move_log)
+        game.start_time = self.start_time
+
+        # the snapshot has this game's clock, which the given one shouldn't take on
+        clock_snapshot = clock.snapshot()
+        game.restore(self.snapshot())
+        clock.restore(clock_snapshot)
+        return game
 
     def mark_ready(self, player):
         self.players_ready[player] = True
         if all(self.players_ready.values()):
             self.started = True
-            self.last_move_time = time.time()
-            self.last_tick_time = time.time()
+            self.last_move_time = self.clock.time()
+            self.last_tick_time = self.last_move_time
 
     def to_json_obj(self):
         return {
@@ -597,7 +997,7 @@ class Game(object):
             'cooldowns': [cooldown.to_json_obj() for cooldown in self.cooldowns],
             'moveLog': [move.to_json_obj() for move in self.move_log],
             'currentTick': self.current_tick,
-            'timeSinceLastTick': time.time() - self.last_tick_time,
+            'timeSinceLastTick': self.clock.time() - self.last_tick_time,
             'started': self.started,
             'finished': self.finished,
             'startTime': str(self.start_time),
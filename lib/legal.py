@@ -0,0 +1,126 @@
+from lib.bitboard import square_bit
+from lib.moves import KNIGHT_TARGETS, KING_RAYS, QUEEN_RAYS
+
+
+# squares where castling looks for a rook that hasn't moved
+_CORNERS = [(0, 0), (0, 7), (7, 0), (7, 7)]
+
+# (type, player, row, col, moved) -> squares that can change a piece's legal moves, see _get_watched_squares
+_watched_squares_cache = {}
+
+
+# bitboard of the squares whose contents a piece's legal moves depend on: every square on its rays whether or not
+# anything blocks them (which can change), and for kings that can still castle, their whole row
+def _get_watched_squares(type, player, row, col, moved):
+    key = (type, player, row, col, moved)
+    result = _watched_squares_cache.get(key)
+    if result is None:
+        if type == 'P':
+            row_dir = -1 if player == 1 else 1
+            squares = [(row + row_dir, col + col_dir) for col_dir in (-1, 0, 1)] + [(row + 2 * row_dir, col)]
+        elif type == 'N':
+            squares = KNIGHT_TARGETS[row][col]
+        elif type == 'K':
+            squares = [square for ray in KING_RAYS[row][col] for square in ray]
+            if not moved:
+                squares += [(row, c) for c in xrange(8)]
+        else:
+            squares = [square for ray in QUEEN_RAYS[row][col] for square in ray]
+
+        result = 0
+        for square_row, square_col in squares:
+            result |= square_bit(square_row, square_col)
+        _watched_squares_cache[key] = result
+    return result
+
+
+class LegalMoves(object):
+
+    # legal destinations of idle pieces, worked out on first use and kept until something they depend on changes: the
+    # piece itself, what is on a square on its rays, or whether such a square is a destination or still ahead on the
+    # path of a move of its side. at the first read after every tick or move the game is compared with how it was at
+    # the last one, to find the squares that changed
+    def __init__(self, game):
+        self.game = game
+
+        # the game as of the last read: each player's occupancy, the piece found on each square with a moving piece
+        # (by the square's bit) and whether it's moving, whether each corner has a rook that hasn't moved, and the
+        # destinations and squares still ahead of each player's moves
+        self._version = None
+        self._occupancy = (0, 0)
+        self._occupants = {}
+        self._corners = [None] * len(_CORNERS)
+        self._move_squares = {player: (frozenset(), frozenset()) for player in game.players}
+
+        self._destinations = {}  # piece id -> (player, (type, row, col, moved), destinations, watched squares)
+
+    # called by the game when it is restored to a snapshot, after which the next read compares everything
+    def restore(self):
+        self._version = None
+
+    # legal destinations of the idle piece, see Game.legal_moves
+    def get(self, piece):
+        self._update()
+
+        key = (piece.type, piece.row, piece.col, piece.moved)
+        entry = self._destinations.get(piece.id)
+        if entry is None or entry[1] != key:
+            destinations = tuple(self.game._compute_legal_moves(piece))
+            watched = _get_watched_squares(piece.type, piece.player, piece.row, piece.col, piece.moved)
+            entry = self._destinations[piece.id] = (piece.player, key, destinations, watched)
+        return entry[2]
+
+    # drops destinations that might have changed since the last read
+    def _update(self):
+        game = self.game
+        version = (game.current_tick, len(game.move_log))
+        if version == self._version:
+            return
+        self._version = version
+
+        # squares without a moving piece have at most one piece, which is static, so their occupancy is enough.
+        # moving pieces share squares while they pass others, in which case moves see the first one in board order
+        board = game.board
+        bitboards = board.get_bitboards()
+        occupancy = (bitboards.players[1], bitboards.players[2])
+        changed = (occupancy[0] ^ self._occupancy[0]) | (occupancy[1] ^ self._occupancy[1])
+        self._occupancy = occupancy
+
+        occupants = {}
+        for move in game.active_moves:
+            piece = move.piece
+            bit = square_bit(piece.row, piece.col)
+            if bit and not piece.captured and bit not in occupants:
+                occupant = board.get_piece_by_location(piece.row, piece.col)
+                occupants[bit] = (occupant.id, occupant.id in game.active_moves_by_piece_id)
+
+        for bit, occupant in occupants.iteritems():
+            if self._occupants.get(bit) != occupant:
+                changed |= bit
+        for bit in self._occupants:
+            if bit not in occupants:
+                changed |= bit
+        self._occupants = occupants
+
+        for i, (row, col) in enumerate(_CORNERS):
+            p = board.get_piece_by_location(row, col)
+            corner = p is not None and not p.moved and p.id
+            if corner != self._corners[i]:
+                self._corners[i] = corner
+                changed |= square_bit(row, col)
+
+        changed_by_player = {}
+        for player, (old_destinations, old_future_squares) in self._move_squares.iteritems():
+            destinations, future_squares = game._get_same_player_move_squares(player)
+            self._move_squares[player] = (destinations, future_squares)
+
+            player_changed = changed
+            if destinations != old_destinations or future_squares != old_future_squares:
+                for row, col in (destinations ^ old_destinations) | (future_squares ^ old_future_squares):
+                    player_changed |= square_bit(row, col)
+            changed_by_player[player] = player_changed
+
+        for piece_id, entry in self._destinations.items():
+            player, watched = entry[0], entry[3]
+            if watched & changed_by_player[player]:
+                del self._destinations[piece_id]
@@ -0,0 +1,71 @@
+# precomputed move tables, indexed by [row][col] of the starting square
+
+KNIGHT_DIRS = [
+    (2, 1),
+    (2, -1),
+    (1, -2),
+    (-1, -2),
+    (-2, -1),
+    (-2, 1),
+    (-1, 2),
+    (1, 2),
+]
+BISHOP_DIRS = [
+    (1, 1),
+    (1, -1),
+    (-1, -1),
+    (-1, 1),
+]
+ROOK_DIRS = [
+    (1, 0),
+    (0, -1),
+    (-1, 0),
+    (0, 1),
+]
+
+KNIGHT_DIR_SET = frozenset(KNIGHT_DIRS)
+
+
+def _in_bounds(row, col):
+    return row >= 0 and row < 8 and col >= 0 and col < 8
+
+
+def _get_ray(row, col, row_dir, col_dir, limit):
+    ray = []
+    for i in xrange(1, limit + 1):
+        row, col = row + row_dir, col + col_dir
+        if not _in_bounds(row, col):
+            break
+        ray.append((row, col))
+    return tuple(ray)
+
+
+def _build(fn):
+    return [[fn(row, col) for col in xrange(8)] for row in xrange(8)]
+
+
+# squares reached by moving from a square in a direction until the edge of the board, for every sliding direction
+# and every knight jump (which only has one square); RAYS[row][col][(row_dir, col_dir)]
+RAYS = _build(lambda row, col: dict(
+    [((row_dir, col_dir), _get_ray(row, col, row_dir, col_dir, 7)) for row_dir, col_dir in BISHOP_DIRS + ROOK_DIRS] +
+    [((row_dir, col_dir), _get_ray(row, col, row_dir, col_dir, 1)) for row_dir, col_dir in KNIGHT_DIRS]
+))
+
+# rays for each piece type, in the same direction order as the *_DIRS lists (bishop directions first for queens)
+BISHOP_RAYS = _build(lambda row, col: [RAYS[row][col][d] for d in BISHOP_DIRS])
+ROOK_RAYS = _build(lambda row, col: [RAYS[row][col][d] for d in ROOK_DIRS])
+QUEEN_RAYS = _build(lambda row, col: BISHOP_RAYS[row][col] + ROOK_RAYS[row][col])
+KING_BISHOP_RAYS = _build(lambda row, col: [ray[:1] for ray in BISHOP_RAYS[row][col]])
+KING_ROOK_RAYS = _build(lambda row, col: [ray[:1] for ray in ROOK_RAYS[row][col]])
+KING_RAYS = _build(lambda row, col: KING_BISHOP_RAYS[row][col] + KING_ROOK_RAYS[row][col])
+
+KNIGHT_TARGETS = _build(lambda row, col: [ray[0] for ray in (RAYS[row][col][d] for d in KNIGHT_DIRS) if ray])
+KING_TARGETS = _build(lambda row, col: [ray[0] for ray in KING_RAYS[row][col] if ray])
+
+# squares a pawn attacks diagonally, PAWN_CAPTURES[player][row][col]
+PAWN_CAPTURES = [None] + [
+    _build(lambda row, col, row_dir=row_dir: [
+        (row + row_dir, col + col_dir) for col_dir in (-1, 1) if _in_bounds(row + row_dir, col + col_dir)
+    ])
+    for row_dir in (-1, 1)
+]
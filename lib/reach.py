@@ -0,0 +1,77 @@
+import numpy as np
+
+from lib.bitboard import SQUARE_INDEX, get_attacks
+
+
+# ticks from now for squares a piece can't capture on with its next move
+NOT_REACHABLE = 1 << 30
+
+# squares covered by a move between two squares along a line (knights always take two movements)
+_LINE_DISTANCES = np.array(
+    [[max(abs(a / 8 - b / 8), abs(a % 8 - b % 8)) for b in xrange(64)] for a in xrange(64)], np.int64
+)
+
+# (type, player, square, move ticks) -> ticks for a move to each square, see _get_move_ticks
+_move_ticks_cache = {}
+
+
+# ticks a piece of the type at the square needs to capture on each square, or NOT_REACHABLE. this is on an empty
+# board: blockers change with every move considered, so callers check them separately
+def _get_move_ticks(type, player, square, move_ticks):
+    key = (type, player, square, move_ticks)
+    result = _move_ticks_cache.get(key)
+    if result is None:
+        reach = get_attacks(type, player, square, 0)
+        reachable = np.array([(reach >> s) & 1 for s in xrange(64)], np.bool_)
+        distances = 2 if type == 'N' else _LINE_DISTANCES[square]
+        result = _move_ticks_cache[key] = np.where(reachable, distances * move_ticks, NOT_REACHABLE)
+    return result
+
+
+class ReachMap(object):
+
+    # the earliest a piece could capture on each square with its next move, counting the ticks until it's free to
+    # move (the cooldown left, or the rest of its move and the cooldown after it for pieces in flight) and the ticks of
+    # the move itself, which for pieces in flight starts from where they're headed. the ticks for the move itself are
+    # kept for every piece and only looked up again for pieces that were captured, promoted or moved since the last read
+    def __init__(self, game):
+        self.game = game
+
+        # per piece in board order: what its move ticks were looked up for, and the move ticks to each square
+        self._keys = []
+        self._move_ticks = np.zeros((0, 64), np.int32)
+
+    # ticks from now until each piece, in board order, could capture on each square (as an array of pieces by squares)
+    def get_arrival_ticks(self):
+        game = self.game
+        pieces = game.board.pieces
+        if len(self._keys) != len(pieces):
+            self._keys = [None] * len(pieces)
+            self._move_ticks = np.full((len(pieces), 64), NOT_REACHABLE, np.int32)
+
+        current_tick = game.current_tick
+        free_ticks = []
+        for i, p in enumerate(pieces):
+            move = game.active_moves_by_piece_id.get(p.id)
+            if move is not None:
+                row, col = move.move_seq[-1]
+                key = (p.id, p.type, p.captured, row, col)
+                end_tick = move.starting_tick + game.move_ticks * (len(move.move_seq) - 1)
+                free_ticks.append(end_tick + game.cooldown_ticks - current_tick)
+            else:
+                key = (p.id, p.type, p.captured, p.row, p.col)
+                cooldown = game.cooldowns_by_piece_id.get(p.id)
+                if cooldown is None:
+                    free_ticks.append(0)
+                else:
+                    free_ticks.append(cooldown.starting_tick + game.cooldown_ticks - current_tick)
+
+            if key != self._keys[i]:
+                self._keys[i] = key
+                square = SQUARE_INDEX.get(key[3:])
+                if p.captured or square is None:
+                    self._move_ticks[i] = NOT_REACHABLE
+                else:
+                    self._move_ticks[i] = _get_move_ticks(p.type, p.player, square, game.move_ticks)
+
+        return self._move_ticks + np.array(free_ticks, np.int64)[:, None]
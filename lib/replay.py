@@ -3,8 +3,11 @@ import collections
 
 class ReplayMove(object):
 
+    __slots__ = ('piece_id', 'player', 'row', 'col', 'tick')
+
     def __init__(self, piece_id, player, row, col, tick):
-        self.piece_id = piece_id
+        # piece ids are interned like those of Piece, since replays repeat them for every move
+        self.piece_id = intern(str(piece_id))
         self.player = player
         self.row = row
         self.col = col
@@ -0,0 +1,157 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from lib import ai, elo
+from lib.clock import TICK_PERIOD, VirtualClock
+from lib.game import Game, Speed
+
+
+# games still going after this many ticks are counted as draws
+DEFAULT_MAX_TICKS = 20000
+
+
+# a bot from a spec like 'advanced' or 'advanced:CAPTURE_WEIGHT=40,top_n_moves=2', i.e. a difficulty optionally
+# followed by bot attributes to override, such as the scoring weights ('none' for None, like for no time budget)
+def get_bot(spec):
+    difficulty, _, overrides = spec.partition(':')
+    if difficulty in ai.EXPERIMENTAL_DIFFICULTIES:
+        bot = ai.get_experimental_bot(difficulty)
+    else:
+        bot = ai.get_bot(difficulty)
+    for override in overrides.split(','):
+        if not override:
+            continue
+
+        name, _, value = override.partition('=')
+        if not hasattr(bot, name):
+            raise ValueError('Unexpected bot attribute ' + name)
+        setattr(bot, name, _parse_value(value))
+    return bot
+
+
+def _parse_value(value):
+    if value.lower() == 'none':
+        return None
+
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+# plays one game between the bots of the two specs on virtual time, with the random numbers seeded so that every game
+# can be played again exactly (as long as no time budget cuts a decision short). returns the index of the spec that
+# won (None for a draw), the length of the game in ticks, and the number of decisions and seconds spent deciding for
+# each spec
+def play_game(specs, speed, seed, first_spec=0, max_ticks=DEFAULT_MAX_TICKS):
+    random.seed(seed)
+
+    spec_by_player = {1: first_spec, 2: 1 - first_spec}
+    bots = {player: get_bot(specs[i]) for player, i in spec_by_player.iteritems()}
+    players = {player: 'b:%s' % bot.difficulty for player, bot in bots.iteritems()}
+    game = Game(Speed(speed), players, clock=VirtualClock())
+
+    num_decisions = [0, 0]
+    decision_times = [0.0, 0.0]
+    while not game.finished and game.current_tick < max_ticks:
+        for player, bot in bots.iteritems():
+            # the same as bot.get_move, but timing only the decisions
+            if not bot._should_move(game, random.randint(0, 9999)):
+                continue
+
+            start = time.time()
+            move = bot.choose_move(game, player)
+            decision_times[spec_by_player[player]] += time.time() - start
+            num_decisions[spec_by_player[player]] += 1
+
+            if move:
+                piece, row, col = move
+                game.move(piece.id, player, row, col)
+
+        game.tick()
+
+    winner = spec_by_player[game.finished] if game.finished > 0 else None
+    return winner, game.current_tick, num_decisions, decision_times
+
+
+def _init_worker():
+    # bots print their moves, which would drown out the results
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _play_game(args):
+    return play_game(*args)
+
+
+# plays num_games games between the bots of the two specs over a pool of worker processes, taking turns at which
+# spec plays first. game i is seeded with seed + i, so the whole tournament can be played again
+def play_tournament(specs, num_games, speed=Speed.STANDARD, seed=0, num_workers=None, max_ticks=DEFAULT_MAX_TICKS):
+    games = [(specs, speed, seed + i, i % 2, max_ticks) for i in xrange(num_games)]
+    if num_workers == 1:
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            return map(_play_game, games)
+        finally:
+            sys.stdout = stdout
+
+    pool = multiprocessing.Pool(num_workers, _init_worker)
+    try:
+        return pool.map(_play_game, games, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays bots against each other and reports how they did.')
+    parser.add_argument('spec_a', help="bot, like 'advanced' or 'advanced:CAPTURE_WEIGHT=40,PROTECT_WEIGHT=6'")
+    parser.add_argument('spec_b', help='bot to play against')
+    parser.add_argument('-n', '--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--speed', default=Speed.STANDARD, choices=[Speed.STANDARD, Speed.LIGHTNING])
+    parser.add_argument('--max-ticks', type=int, default=DEFAULT_MAX_TICKS, help='ticks before calling a draw')
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error('number of games must be at least 1')
+
+    specs = [args.spec_a, args.spec_b]
+    for spec in specs:
+        # fail here rather than in every worker
+        try:
+            get_bot(spec)
+        except ValueError as e:
+            parser.error(str(e))
+
+    start = time.time()
+    results = play_tournament(specs, args.games, args.speed, args.seed, args.workers, args.max_ticks)
+    elapsed = time.time() - start
+
+    wins = sum(1 for result in results if result[0] == 0)
+    losses = sum(1 for result in results if result[0] == 1)
+    draws = len(results) - wins - losses
+    ticks = sum(result[1] for result in results) / float(len(results))
+
+    print '%s vs %s, %d games at %s speed' % (specs[0], specs[1], len(results), args.speed)
+    print '%d wins, %d draws, %d losses' % (wins, draws, losses)
+
+    difference, error = elo.estimate_difference(wins, draws, losses)
+    if difference is None:
+        print 'elo difference: unbounded'
+    else:
+        print 'elo difference: %+.0f +/- %.0f' % (difference, error)
+
+    print 'average game length: %.0f ticks (%.1fs)' % (ticks, ticks * TICK_PERIOD)
+    for i, spec in enumerate(specs):
+        num_decisions = sum(result[2][i] for result in results)
+        decision_time = sum(result[3][i] for result in results)
+        print '%s: %.1f decisions per second' % (spec, num_decisions / decision_time if decision_time else 0)
+    print 'took %.1fs' % elapsed
+
+
+if __name__ == '__main__':
+    main()
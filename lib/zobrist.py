@@ -0,0 +1,76 @@
+import random
+
+
+# keys come from a fixed seed, so hashes agree between processes and runs
+_random = random.Random(0x5eed)
+
+# pieces are always on a grid of half squares (knights in the air are halfway between squares)
+NUM_POSITIONS = 15 * 15
+
+TYPE_INDEX = {t: i for i, t in enumerate(('P', 'N', 'B', 'R', 'Q', 'K'))}
+
+# a key for each (player, type, captured, moved, position) of a piece, see get_piece_key
+PIECE_KEYS = [_random.getrandbits(64) for i in xrange(2 * len(TYPE_INDEX) * 2 * 2 * NUM_POSITIONS)]
+
+# active moves and cooldowns are hashed as a sum of key * BASE ** starting tick modulo a prime, which turns into the
+# hash relative to the current tick when multiplied by BASE ** -current tick. that way the same motion hashes the
+# same whichever tick it happens at, without every term changing on every tick
+MOTION_MODULUS = (1 << 61) - 1
+BASE = _random.randint(2, MOTION_MODULUS - 2)
+BASE_INVERSE = pow(BASE, MOTION_MODULUS - 2, MOTION_MODULUS)
+
+_MOVE = 0
+_COOLDOWN = 1
+
+
+def get_position_index(row, col):
+    return int(row * 2) * 15 + int(col * 2)
+
+
+def get_piece_key(piece):
+    index = (piece.player - 1) * len(TYPE_INDEX) + TYPE_INDEX[piece.type]
+    index = (index * 2 + piece.captured) * 2 + piece.moved
+    return PIECE_KEYS[index * NUM_POSITIONS + get_position_index(piece.row, piece.col)]
+
+
+def get_pieces_hash(pieces):
+    result = 0
+    for p in pieces:
+        result ^= get_piece_key(p)
+    return result
+
+
+# term of an active move in the motion hash; the piece, start and destination determine the whole path
+def get_move_term(move):
+    start, end = move.move_seq[0], move.move_seq[-1]
+    key = _get_motion_key(
+        _MOVE, move.piece, get_position_index(start[0], start[1]) * NUM_POSITIONS + get_position_index(end[0], end[1])
+    )
+    return key * pow(BASE, move.starting_tick, MOTION_MODULUS) % MOTION_MODULUS
+
+
+# term of a cooldown in the motion hash
+def get_cooldown_term(cooldown):
+    piece = cooldown.piece
+    key = _get_motion_key(_COOLDOWN, piece, get_position_index(piece.row, piece.col))
+    return key * pow(BASE, cooldown.starting_tick, MOTION_MODULUS) % MOTION_MODULUS
+
+
+# the motion hash as of the given tick
+def get_relative_motion_hash(motion_hash, current_tick):
+    return motion_hash * pow(BASE_INVERSE, current_tick, MOTION_MODULUS) % MOTION_MODULUS
+
+
+# motion has too many combinations of positions for a table of keys, so they're mixed from the values instead
+def _get_motion_key(kind, piece, value):
+    index = (piece.player - 1) * len(TYPE_INDEX) + TYPE_INDEX[piece.type]
+    return _mix((value * 2 * len(TYPE_INDEX) + index) * 2 + kind) % MOTION_MODULUS
+
+
+# splitmix64's finalizer, which spreads every bit of x over the whole result
+def _mix(x):
+    mask = (1 << 64) - 1
+    x = (x + 0x9e3779b97f4a7c15) & mask
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & mask
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & mask
+    return x ^ (x >> 31)
@@ -199,9 +199,9 @@ def difficulty(data):
     game_state = game_states[game_id]
     auth_player = get_auth_player(game_state, player_key)
 
-    # only authenticated players can change difficulty
+    # only authenticated players can change difficulty, and only to one they could have picked
     if auth_player is not None:
-        if not game_state.game.players[player].startswith('b'):
+        if not game_state.game.players[player].startswith('b') or difficulty not in ai.PUBLIC_DIFFICULTIES:
             return
 
         game_state.bots[player] = ai.get_bot(difficulty)
@@ -15,14 +15,22 @@ import context
 from db import db_service
 from lib import ai, campaign, elo
 from lib.board import Board
+from lib.botpool import BotPool, BotScheduler
+from lib.clock import TICK_PERIOD
 from lib.game import Game, GameState, Speed
 from lib.replay import Replay
 from web import game_states
 
 
-TICK_PERIOD = 0.1
 DEFAULT_RATING = 1200
 
+# bot decisions run in this many worker processes (None for one per core, 0 to decide in the tick loop), and are
+# dropped if they take more than this many ticks. decisions with time budgets adding up to at most this many
+# microseconds are started per tick (as many as 20 advanced ones); the rest wait
+BOT_WORKERS = None
+BOT_MAX_LATENCY_TICKS = 5
+BOT_MAX_DECISION_TIME_PER_TICK = 600000
+
 game = Blueprint('game', __name__)
 
 socketio = None  # populated by initialize()
@@ -37,10 +45,17 @@ def new():
     data = json.loads(request.data)
     speed = data['speed']
     bots = data.get('bots', {})
-    bots = {int(player): ai.get_bot(difficulty) for player, difficulty in bots.iteritems()}
     username = data.get('username')
     print 'new game', data
 
+    # only bots players can pick are built for them
+    if any(difficulty not in ai.PUBLIC_DIFFICULTIES for difficulty in bots.itervalues()):
+        return json.dumps({
+            'success': False,
+            'message': 'Unexpected bot difficulty.',
+        })
+    bots = {int(player): ai.get_bot(difficulty) for player, difficulty in bots.iteritems()}
+
     # generate game ID and player keys
     game_id = generate_game_id()
     player_keys = {i: str(uuid.uuid4()) for i in xrange(1, 3) if i not in bots}
@@ -291,6 +306,9 @@ def initialize(init_socketio):
     # clear all active games on server init
     db_service.clear_active_games(context.SERVER)
 
+    bot_pool = BotPool(num_workers=BOT_WORKERS, max_latency_ticks=BOT_MAX_LATENCY_TICKS)
+    bot_scheduler = BotScheduler(max_decision_time_per_tick=BOT_MAX_DECISION_TIME_PER_TICK)
+
     # infinite loop that ticks all active games
     def tick():
         start = time.time()
@@ -307,9 +325,21 @@ def initialize(init_socketio):
                 if tick_number % 600 == 0:
                     # log extra info and flush every minute
                     print 'game tick', tick_number
+                    print 'bot decisions', bot_pool.num_requested, bot_pool.num_applied, bot_pool.num_skipped
+                    print 'bot time budgets', bot_pool.num_cut_short, bot_pool.num_over_budget, \
+                        bot_pool.max_decision_time
+                    print 'bot decisions deferred', bot_scheduler.num_deferred, 'of', bot_scheduler.num_decisions
+                    print 'bot decision cache hits', bot_pool.num_cache_hits, 'of', bot_pool.num_decided
+                    print 'bot workers restarted', bot_pool.num_restarted
                     sys.stdout.flush()
 
-                randnum = random.randint(0, 9999)
+                # on its own, so that trouble with the bot workers doesn't stop games from ticking
+                try:
+                    bot_pool.poll()
+                except:
+                    traceback.print_exc()
+
+                bot_scheduler.start_tick(bot_pool.pending)
 
                 current_time = time.time()
                 expired_games = set()
@@ -342,13 +372,19 @@ def initialize(init_socketio):
                         traceback.print_exc()
 
                     try:
-                        # check for bot moves (after game has been running for 1s)
+                        # check for bot moves (after game has been running for 1s); decisions made by the workers
+                        # come back on a later tick
                         if game.current_tick >= 10:
                             for player, bot in game_state.bots.iteritems():
-                                move = bot.get_move(game, player, randnum)
+                                if (
+                                    not bot_pool.is_pending(game_id, game, player) and
+                                    bot_scheduler.should_decide(game_id, game, player, bot)
+                                ):
+                                    bot_pool.request(game_id, game, player, bot)
+                                move = bot_pool.get_move(game_id, game, player)
                                 if move:
-                                    piece, row, col = move
-                                    game.move(piece.id, player, row, col)
+                                    piece_id, row, col = move
+                                    game.move(piece_id, player, row, col)
                                     moved = True
                     except:
                         traceback.print_exc()
@@ -476,6 +512,8 @@ def initialize(init_socketio):
                             db_service.update_user_current_game(user_id2, None, None)
 
                         del game_states[game_id]
+                        bot_pool.remove_game(game_id)
+                        bot_scheduler.remove_game(game_id)
                     except:
                         traceback.print_exc()
             except: